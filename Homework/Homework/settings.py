@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,13 +50,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.perf.PerfMiddleware',
 ]
 
 ROOT_URLCONF = 'Homework.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'main.perf.PerfTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -63,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.sidebar',
             ],
         },
     },
@@ -74,21 +78,112 @@ WSGI_APPLICATION = 'Homework.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'vk_web',
-        'USER': 'postgres',
-        'PASSWORD': 'Artur-123',
-        'HOST': 'localhost',
-        'PORT': '5432',
+# Параметры базы берутся из окружения. По умолчанию PostgreSQL; пул
+# соединений psycopg включается, если установлен psycopg_pool
+# (pip install "psycopg[pool]"): пул свой в каждом процессе-воркере,
+# DB_POOL_MAX_SIZE — предел соединений на воркер. Без пула (DB_POOL=0 или
+# psycopg2) соединение живет DB_CONN_MAX_AGE секунд.
+# DB_ENGINE=sqlite — локальная SQLite без сервера (пул и постоянные
+# соединения ей не нужны).
+DB_ENGINE = os.environ.get('DB_ENGINE', 'postgresql')
+DB_POOL = os.environ.get('DB_POOL', '1' if importlib.util.find_spec('psycopg_pool') else '0') == '1'
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Потоки async-представлений пишут параллельно.
+                'timeout': 20,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'vk_web'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', 'Artur-123'),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # С пулом соединение проверяется при выдаче из пула, без пула —
+            # перед повторным использованием в новом запросе.
+            'CONN_HEALTH_CHECKS': True,
+            # Пул не совместим с CONN_MAX_AGE: соединения держит он сам.
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'OPTIONS': {},
+        }
     }
+    if DB_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Сколько секунд запрос ждет свободное соединение до ошибки.
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            # Простаивающие соединения сверх min_size закрываются.
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+        }
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Версии условных GET (main.versions) должны быть общими для всех
+    # воркеров, иначе сдвиг версии видит только процесс, сделавший запись.
+    # locmem годится только для одного процесса; в проде — Redis, Memcached
+    # или DatabaseCache (после createcachetable), см. check --deploy.
+    'versions': {
+        'BACKEND': os.environ.get('VERSIONS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('VERSIONS_CACHE_LOCATION', 'versions'),
+    },
+    # Буфер голосов не должен вытесняться, поэтому у него свой большой кэш.
+    'votes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'votes',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
 }
 
+VERSIONS_CACHE = 'versions'
+
+# Отложенная запись счетчиков лайков: голоса пишутся сразу, а изменения
+# likes_count/dislikes_count копятся в кэше VOTE_BUFFER_CACHE и сбрасываются
+# пачками потоком раз в VOTE_BUFFER_FLUSH_INTERVAL секунд или командой
+# flush_vote_buffer (для общего кэша вроде filebased/redis).
+VOTE_BUFFER_ENABLED = False
+VOTE_BUFFER_CACHE = 'votes'
+VOTE_BUFFER_FLUSH_INTERVAL = 5
+
+
+# Статистика запросов по именам URL: заголовки X-Perf-* при DEBUG, лог
+# main.perf (WARNING для запросов дольше PERF_SLOW_REQUEST_MS) и /_perf/.
+PERF_ENABLED = True
+PERF_SLOW_REQUEST_MS = 500
+
+# Async-версии лент, страницы вопроса и голосования (main.async_views): части
+# страницы загружаются параллельно. Имеет смысл только под ASGI-сервером
+# (uvicorn/daphne с Homework.asgi); под WSGI каждый такой запрос оборачивается
+# в отдельный цикл событий.
+ASYNC_VIEWS = False
+
+# Условные GET для лент и страницы вопроса (main.conditional): анонимные
+# страницы помечаются public и могут храниться прокси столько секунд,
+# страницы вошедших пользователей — private, no-cache (только с ETag).
+ANONYMOUS_PAGE_MAX_AGE = 10
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Миниатюры аватаров (main.avatars) делаются в пуле из AVATAR_WORKERS
+# потоков после ответа на загрузку; False — прямо в запросе.
+AVATAR_BACKGROUND = True
+AVATAR_WORKERS = 2
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,6 +221,29 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic добавляет к именам хеш содержимого и пишет рядом .gz/.br
+# (main.staticfiles); при DEBUG статика берется из приложений как есть.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'main.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Статику и медиа отдает main.serving; False — если их отдает nginx.
+SERVE_FILES = True
+# Файлы без хеша в имени (статика вне манифеста, старые аватары).
+STATIC_MAX_AGE = 60 * 60
+MEDIA_MAX_AGE = 60 * 60
+# None, 'X-Sendfile' (Apache, lighttpd) или 'X-Accel-Redirect' (nginx,
+# internal location с alias на MEDIA_ROOT по адресу MEDIA_ACCEL_PREFIX).
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -1,7 +1,22 @@
 from django.contrib import admin
-from .models import User, Question, Tag, Answer
+from .models import User, Question, Tag, Answer, Vote
+
+
+class QuestionAdmin(admin.ModelAdmin):
+    list_display = ('title', 'author', 'created_at', 'likes_count', 'dislikes_count')
+    list_select_related = ('author',)
+    readonly_fields = ('likes_count', 'dislikes_count')
+    raw_id_fields = ('author',)
+
+
+class VoteAdmin(admin.ModelAdmin):
+    list_display = ('user', 'question', 'value', 'created_at')
+    list_select_related = ('user', 'question')
+    raw_id_fields = ('user', 'question')
+
 
 admin.site.register(User)
-admin.site.register(Question)
+admin.site.register(Question, QuestionAdmin)
 admin.site.register(Tag)
 admin.site.register(Answer)
+admin.site.register(Vote, VoteAdmin)
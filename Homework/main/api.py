@@ -0,0 +1,193 @@
+"""Read-only JSON API for the feeds and the question page.
+
+Responses carry a strong ETag built from the rows of the page (their
+``updated_at``, counters and author names) and the page cursors. The ETag
+is checked before anything is serialized, so an unchanged page costs one
+query and an empty 304 response.
+"""
+import hashlib
+
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_GET
+
+from . import vote_buffer
+from .models import Answer, Question
+from .pagination import KeysetPaginator
+from .views import FEED_FIELDS, TAG_FEED_ORDERINGS, feed_sort, resolve_tags, tagged_postings
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# От автора в ответе только имя.
+SUMMARY_FIELDS = (*FEED_FIELDS, 'updated_at', 'author__username')
+
+
+# Сериализаторы пишут поля явно: без обхода _meta и без DRF.
+
+def author_data(user):
+    return {'id': user.id, 'username': user.username}
+
+
+def question_summary(question):
+    return {
+        'id': question.id,
+        'title': question.title,
+        'preview': question.preview,
+        'author': author_data(question.author),
+        'tags': [tag.title for tag in question.tags.all()],
+        'created_at': question.created_at.isoformat(),
+        'likes': question.likes_count,
+        'dislikes': question.dislikes_count,
+        'answers_count': question.answers_count,
+    }
+
+
+def question_detail(question):
+    data = question_summary(question)
+    del data['preview']
+    data['text'] = question.text
+    return data
+
+
+def answer_data(answer):
+    return {
+        'id': answer.id,
+        'text': answer.text,
+        'author': author_data(answer.author),
+        'is_correct': answer.is_correct,
+        'created_at': answer.created_at.isoformat(),
+    }
+
+
+def question_version(question):
+    # Смена тегов сдвигает updated_at (signals.touch_questions), а имя автора
+    # уже загружено select_related.
+    return (question.id, question.updated_at, question.likes_count, question.dislikes_count,
+            question.answers_count, question.author.username)
+
+
+def answer_version(answer):
+    # is_correct снимается через update() в mark_as_correct, мимо auto_now.
+    return answer.id, answer.updated_at, answer.is_correct, answer.author.username
+
+
+def make_etag(*parts):
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return quote_etag(digest)
+
+
+def not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def json_response(data, etag):
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+    response['ETag'] = etag
+    return response
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def page_payload(page, serialize):
+    return {
+        'results': [serialize(item) for item in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def feed_response(request, questions, ordering):
+    # Колонки ключа сортировки нужны для курсоров.
+    fields = {*SUMMARY_FIELDS, *(name.lstrip('-') for name in ordering)}
+    questions = questions.only(*fields).select_related('author')
+    page = KeysetPaginator(questions, ordering, get_limit(request)).get_page(request.GET.get('cursor'))
+    return questions_response(request, page)
+
+
+def questions_response(request, page):
+    vote_buffer.apply_pending(page.object_list)
+
+    etag = make_etag(
+        [question_version(question) for question in page],
+        page.next_cursor,
+        page.previous_cursor,
+    )
+    if not_modified(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+
+    # Теги нужны только для тела ответа.
+    prefetch_related_objects(page.object_list, 'tags')
+    return json_response(page_payload(page, question_summary), etag)
+
+
+@require_GET
+def new_questions(request):
+    return feed_response(request, Question.objects.all(), ('-created_at', '-id'))
+
+
+@require_GET
+def hot_questions(request):
+    return feed_response(request, Question.objects.all(), ('-hot_score', '-id'))
+
+
+@require_GET
+def tag_questions(request, tag_name):
+    # Как и HTML-лента: /api/tags/a+b/questions/ — пересечение тегов.
+    tags = resolve_tags(tag_name)
+    ordering = TAG_FEED_ORDERINGS[feed_sort(request)]
+    paginator = KeysetPaginator(tagged_postings(tags, SUMMARY_FIELDS), ordering, get_limit(request))
+    page = paginator.get_page(request.GET.get('cursor'))
+    page.object_list = [posting.question for posting in page.object_list]
+    return questions_response(request, page)
+
+
+def answers_page(request, question_id, cursor=None):
+    answers = Answer.objects.filter(question=question_id).select_related('author')
+    paginator = KeysetPaginator(answers, ('-is_correct', 'created_at', 'id'), get_limit(request))
+    return paginator.get_page(cursor)
+
+
+@require_GET
+def question(request, question_id):
+    question = get_object_or_404(Question.objects.select_related('author'), pk=question_id)
+    vote_buffer.apply_pending([question])
+    # Первая страница ответов; следующие — через question_answers.
+    answers = answers_page(request, question_id)
+
+    etag = make_etag(
+        question_version(question),
+        [answer_version(answer) for answer in answers],
+        answers.next_cursor,
+    )
+    if not_modified(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+
+    prefetch_related_objects([question], 'tags')
+    data = question_detail(question)
+    data['answers'] = page_payload(answers, answer_data)
+    return json_response(data, etag)
+
+
+@require_GET
+def question_answers(request, question_id):
+    if not Question.objects.filter(pk=question_id).exists():
+        raise Http404('Question not found')
+    answers = answers_page(request, question_id, request.GET.get('cursor'))
+
+    etag = make_etag(
+        [answer_version(answer) for answer in answers],
+        answers.next_cursor,
+        answers.previous_cursor,
+    )
+    if not_modified(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+    return json_response(page_payload(answers, answer_data), etag)
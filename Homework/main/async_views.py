@@ -0,0 +1,166 @@
+"""Async variants of the feeds, the question page and the vote endpoints.
+
+They are used instead of the ones in ``views`` when ASYNC_VIEWS is on and
+the project runs under ASGI (Homework/asgi.py). A page is made of pieces
+that do not depend on each other (the question list, the popular tags, the
+best members, the current user); each is fetched in its own worker thread
+and the view awaits them together, so the page costs about as much as its
+slowest piece instead of the sum of all of them.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections
+from django.shortcuts import get_object_or_404, render
+from django.views.decorators.http import require_POST
+
+from . import leaderboards, vote_buffer
+from .conditional import conditional_page, feed_keys, question_keys, tag_keys
+from .fragments import render_question_cards
+from .models import Question, Vote
+from .pagination import paginate_feed
+from .views import (
+    FEED_FIELDS, TAG_FEED_ORDERINGS, answers_paginator, feed_sort, resolve_tags, tagged_postings, vote_response,
+)
+from .votes import attach_vote_state
+
+
+def fetch(func, *args):
+    """Run ``func(*args)`` in a thread of its own and return an awaitable.
+
+    The async ORM methods (``aget``, ``aiterator``...) all go through the one
+    thread-sensitive executor, so gathering them would still run the queries
+    one after another. A separate thread has its own connection and really
+    runs in parallel with the other fetches.
+    """
+    def call():
+        try:
+            return func(*args)
+        finally:
+            # Поток живет дольше запроса: соединение закрываем (или оставляем
+            # для переиспользования) по CONN_MAX_AGE, как после обычного запроса.
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+async def load_page(request, pieces):
+    """Await the page pieces together with the user and the sidebar."""
+    user, popular_tags, best_members, *results = await asyncio.gather(
+        request.auser(),
+        fetch(leaderboards.popular_tags),
+        fetch(leaderboards.best_members),
+        *pieces,
+    )
+    # Шаблоны обращаются к request.user; пользователь уже загружен.
+    request.user = user
+    sidebar = {
+        'popular_tags': popular_tags,
+        'best_members': best_members,
+    }
+    return user, sidebar, results
+
+
+def feed_page(request, questions, ordering, per_page):
+    page_obj = paginate_feed(request, questions, ordering, per_page)
+    page_obj.object_list = list(page_obj.object_list)
+    return page_obj
+
+
+def decorate_page(page_obj, user):
+    # Состояние голосов зависит и от пользователя, и от страницы, поэтому
+    # выполняется вторым шагом, вместе с карточками.
+    page_obj.object_list = attach_vote_state(page_obj.object_list, user)
+    vote_buffer.apply_pending(page_obj.object_list)
+    render_question_cards(page_obj.object_list)
+    return page_obj
+
+
+def tag_feed_page(request, tag_name, sort):
+    tags = resolve_tags(tag_name)
+    postings = tagged_postings(tags, FEED_FIELDS)
+    page_obj = paginate_feed(request, postings, TAG_FEED_ORDERINGS[sort], 10)
+    page_obj.object_list = [posting.question for posting in page_obj.object_list]
+    return {'tags': tags, 'sort': sort, 'questions': page_obj}
+
+
+async def feed(request, template_name, questions, ordering, per_page, context):
+    user, sidebar, (page_obj,) = await load_page(request, [
+        fetch(feed_page, request, questions, ordering, per_page),
+    ])
+    page_obj = await fetch(decorate_page, page_obj, user)
+    context = {**sidebar, **context, 'questions': page_obj}
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@conditional_page(feed_keys)
+async def index(request):
+    questions = Question.objects.only(*FEED_FIELDS).select_related('author')
+    return await feed(request, 'main/index.html', questions, ('-created_at', '-id'), 20, {
+        'title': 'New Questions',
+    })
+
+
+@conditional_page(feed_keys)
+async def hot_questions(request):
+    questions = Question.objects.only(*FEED_FIELDS, 'hot_score').select_related('author')
+    return await feed(request, 'main/index.html', questions, ('-hot_score', '-id'), 20, {
+        'title': 'Hot Questions',
+    })
+
+
+@conditional_page(tag_keys)
+async def tag(request, tag_name):
+    user, sidebar, (context,) = await load_page(request, [
+        fetch(tag_feed_page, request, tag_name, feed_sort(request)),
+    ])
+    context['questions'] = await fetch(decorate_page, context['questions'], user)
+    return await sync_to_async(render)(request, 'main/tag.html', {**sidebar, **context})
+
+
+def question_detail(question_id):
+    question = get_object_or_404(
+        Question.objects.select_related('author').prefetch_related('tags'),
+        pk=question_id
+    )
+    vote_buffer.apply_pending([question])
+    return question
+
+
+def first_answers(question_id):
+    page = answers_paginator(question_id).get_page()
+    page.object_list = list(page.object_list)
+    return page
+
+
+@conditional_page(question_keys)
+async def question(request, question_id):
+    # Ответы выбираются по id вопроса, не дожидаясь самого вопроса.
+    user, sidebar, (me_question, answers) = await load_page(request, [
+        fetch(question_detail, question_id),
+        fetch(first_answers, question_id),
+    ])
+    context = {
+        **sidebar,
+        'question': me_question,
+        'answers': answers,
+    }
+    return await sync_to_async(render)(request, 'main/question.html', context)
+
+
+@login_required
+@require_POST
+async def toggle_like(request):
+    return await vote(request, Vote.LIKE, 'liked')
+
+
+@login_required
+@require_POST
+async def toggle_dislike(request):
+    return await vote(request, Vote.DISLIKE, 'disliked')
+
+
+async def vote(request, value, state_key):
+    user = await request.auser()
+    return await sync_to_async(vote_response)(user, request.POST.get('id'), value, state_key)
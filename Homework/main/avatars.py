@@ -0,0 +1,167 @@
+"""Content-addressed avatars and their thumbnails.
+
+An uploaded avatar is stored as ``avatars/ab/<sha256>.<ext>``, so its URL
+changes with the content and can be cached forever. Square WebP and JPEG
+variants for every size in SIZES are made next to it in a thread pool
+after the upload is committed; until they are ready
+``User.avatar_thumbnails`` is False and pages show the original.
+"""
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from . import versions
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'avatars'
+# Карточки и ответы показывают 48-64px, шапка 50px; второй размер для 2x.
+SIZES = (64, 128)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+# Оригинал или миниатюра: содержимое по такому имени не меняется.
+CONTENT_NAME_RE = re.compile(rf'^{UPLOAD_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(_\d+)?(\.\w+)?$')
+
+_executor = None
+
+
+def storage():
+    return User._meta.get_field('avatar').storage
+
+
+def content_name(uploaded):
+    digest = hashlib.sha256()
+    for chunk in uploaded.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    extension = os.path.splitext(uploaded.name)[1].lower()
+    if extension not in EXTENSIONS:
+        extension = ''
+    return f'{UPLOAD_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+def is_content_name(name):
+    return CONTENT_NAME_RE.match(name) is not None
+
+
+def store_original(uploaded):
+    """Save an uploaded file under its content hash and return the name."""
+    name = content_name(uploaded)
+    # Одинаковый файл у разных пользователей хранится один раз.
+    if not storage().exists(name):
+        uploaded.seek(0)
+        name = storage().save(name, uploaded)
+    return name
+
+
+def set_avatar(user, uploaded):
+    user.avatar = store_original(uploaded)
+    user.avatar_thumbnails = False
+
+
+def variant_name(name, size, extension):
+    return f'{os.path.splitext(name)[0]}_{size}.{extension}'
+
+
+def variant_url(user, size, extension):
+    """URL of the smallest variant not smaller than ``size``.
+
+    Only builds the name, the file system is not touched. Falls back to the
+    original while the variants are not made.
+    """
+    if not user.avatar_thumbnails:
+        return user.avatar.url
+    size = next((variant for variant in SIZES if variant >= size), SIZES[-1])
+    return storage().url(variant_name(user.avatar.name, size, extension))
+
+
+def flatten(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        # Прозрачный фон JPEG не умеет, подкладываем белый.
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def make_variants(name):
+    with storage().open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = flatten(image)
+
+    for size in SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for extension, image_format, options in FORMATS:
+            variant = variant_name(name, size, extension)
+            if storage().exists(variant):
+                continue
+            buffer = BytesIO()
+            thumbnail.save(buffer, image_format, **options)
+            storage().save(variant, ContentFile(buffer.getvalue()))
+
+
+def build_thumbnails(user_id, name):
+    """Make the variants of ``name`` and switch the user over to them."""
+    try:
+        make_variants(name)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning('Could not make thumbnails of avatar %s', name, exc_info=True)
+        return False
+
+    # Пока работали, пользователь мог загрузить другой аватар.
+    if User.objects.filter(pk=user_id, avatar=name).update(avatar_thumbnails=True):
+        versions.bump(versions.user_key(user_id), versions.USERS_KEY)
+    return True
+
+
+def run_in_background(user_id, name):
+    try:
+        build_thumbnails(user_id, name)
+    except Exception:
+        logger.exception('Avatar thumbnails failed for user %s', user_id)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'AVATAR_WORKERS', 2),
+            thread_name_prefix='avatars',
+        )
+    return _executor
+
+
+def schedule_thumbnails(user):
+    """Make the thumbnails once the current transaction is committed.
+
+    They are made in a thread pool, so the request does not wait for them,
+    unless AVATAR_BACKGROUND is False.
+    """
+    if not user.avatar or user.avatar_thumbnails:
+        return
+    user_id, name = user.pk, user.avatar.name
+
+    def submit():
+        if getattr(settings, 'AVATAR_BACKGROUND', True):
+            get_executor().submit(run_in_background, user_id, name)
+        else:
+            build_thumbnails(user_id, name)
+
+    transaction.on_commit(submit)
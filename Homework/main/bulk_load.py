@@ -0,0 +1,97 @@
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+BATCH_SIZE = 10000
+
+
+def load(model, fields, rows, batch_size=BATCH_SIZE):
+    """Write ``rows`` into the table of ``model`` without building instances.
+
+    ``rows`` is any iterable of tuples in the order of ``fields`` (model
+    field names), usually a generator, so memory use does not depend on the
+    number of rows. Concrete fields that are not listed get their default
+    value (``now`` for auto_now_add). The primary key is left to the
+    database unless it is listed. PostgreSQL with psycopg 3 gets a single
+    COPY; everything else gets executemany in batches. Model save() and
+    signals are bypassed. Returns the number of rows written.
+    """
+    now = timezone.now()
+    given = [model._meta.get_field(name) for name in fields]
+    defaults = [
+        field for field in model._meta.concrete_fields
+        if field.name not in fields and not field.primary_key
+    ]
+    columns = [field.column for field in given + defaults]
+    constants = tuple(
+        field.get_db_prep_save(default_value(field, now), connection)
+        for field in defaults
+    )
+    rows = adapt_rows(given, rows)
+    if constants:
+        rows = (row + constants for row in rows)
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    column_list = ', '.join(connection.ops.quote_name(column) for column in columns)
+
+    written = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        raw = cursor.cursor
+        if connection.vendor == 'postgresql' and hasattr(raw, 'copy'):
+            with raw.copy(f'COPY {table} ({column_list}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    written += 1
+            return written
+
+        placeholders = ', '.join(['%s'] * len(columns))
+        sql = f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})'
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return written
+            cursor.executemany(sql, batch)
+            written += len(batch)
+
+
+def default_value(field, now):
+    if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+        return now
+    return field.get_default()
+
+
+def adapt_rows(fields, rows):
+    # Драйверы сами понимают числа и строки; даты для SQLite приводим к тому
+    # виду, в котором их пишет Django.
+    converters = [
+        (index, field) for index, field in enumerate(fields)
+        if isinstance(field, models.DateTimeField)
+    ]
+    if not converters or connection.vendor == 'postgresql':
+        return (tuple(row) for row in rows)
+
+    def adapt(row):
+        row = list(row)
+        for index, field in converters:
+            row[index] = field.get_db_prep_save(row[index], connection)
+        return tuple(row)
+
+    return (adapt(row) for row in rows)
+
+
+def next_id(model):
+    """First primary key above every existing row of ``model``."""
+    return (model.objects.aggregate(high=Max('pk'))['high'] or 0) + 1
+
+
+def reset_sequences(*model_list):
+    """Move id sequences past rows inserted with explicit primary keys."""
+    statements = connection.ops.sequence_reset_sql(no_style(), model_list)
+    if not statements:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
@@ -0,0 +1,79 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Записи живут в кэше дольше, чем считаются свежими: пока один воркер
+# пересчитывает значение, остальные продолжают отдавать старое.
+STALE_FACTOR = 3
+JITTER = 0.2
+LOCK_TIMEOUT = 60
+COLD_WAIT_ATTEMPTS = 20
+COLD_WAIT_INTERVAL = 0.05
+
+
+def get_or_refresh(key, builder, timeout):
+    """Cached ``builder()`` result with early refresh and a single-flight lock.
+
+    The value is considered fresh for ``timeout`` seconds minus a random
+    jitter. After that the first worker to take the lock recomputes it (in a
+    background thread unless CACHE_BACKGROUND_REFRESH is False) while every
+    request keeps getting the stale value. ``builder`` must return evaluated,
+    picklable data, not a lazy QuerySet.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return rebuild_cold(key, builder, timeout)
+
+    value, refresh_at = entry
+    if time.time() >= refresh_at and cache.add(lock_key(key), 1, LOCK_TIMEOUT):
+        if getattr(settings, 'CACHE_BACKGROUND_REFRESH', True):
+            threading.Thread(
+                target=refresh_in_background,
+                args=(key, builder, timeout),
+                daemon=True,
+            ).start()
+        else:
+            try:
+                store(key, builder(), timeout)
+            finally:
+                cache.delete(lock_key(key))
+    return value
+
+
+def rebuild_cold(key, builder, timeout):
+    if not cache.add(lock_key(key), 1, LOCK_TIMEOUT):
+        # Значение уже считает другой воркер, ждем его немного.
+        for _ in range(COLD_WAIT_ATTEMPTS):
+            time.sleep(COLD_WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return builder()
+
+    try:
+        value = builder()
+        store(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key(key))
+
+
+def refresh_in_background(key, builder, timeout):
+    try:
+        store(key, builder(), timeout)
+    finally:
+        cache.delete(lock_key(key))
+        connections.close_all()
+
+
+def store(key, value, timeout):
+    refresh_at = time.time() + timeout * (1 - random.random() * JITTER)
+    cache.set(key, (value, refresh_at), timeout * STALE_FACTOR)
+
+
+def lock_key(key):
+    return f'{key}:lock'
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_versions_cache(app_configs, **kwargs):
+    """Page versions must be shared by all the worker processes."""
+    alias = getattr(settings, 'VERSIONS_CACHE', 'default')
+    if isinstance(caches[alias], LocMemCache):
+        return [Warning(
+            f'Cache "{alias}" that holds the page versions is local to the process.',
+            hint='With several workers a change is seen only by the one that made it, the others keep '
+                 'answering 304. Use Redis, Memcached or DatabaseCache for VERSIONS_CACHE.',
+            id='main.W001',
+        )]
+    return []
@@ -0,0 +1,120 @@
+"""Conditional GET for the feeds and the question page.
+
+A page is described by the versions (see ``versions``) of what it shows.
+From them we build an ETag and Last-Modified before the view runs, so a
+request with a matching If-None-Match / If-Modified-Since gets a 304
+without any feed queries or rendering.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from . import leaderboards, versions
+
+
+class PageState:
+    def __init__(self, request, user, keys):
+        self.user = user
+        if user.is_authenticated:
+            # Шапка со своим никнеймом и аватаром.
+            keys = [*keys, versions.user_key(user.id)]
+        current = versions.get_many(keys)
+        latest = max(current.values())
+
+        # Сайдбар пересчитывается по таймеру, версий у него нет: он входит
+        # в ETag своим содержимым (из кэша) и не влияет на Last-Modified.
+        self.parts = (
+            request.get_full_path(),
+            user.id,
+            sorted(current.items()),
+            leaderboards.popular_tags(),
+            leaderboards.best_members(),
+        )
+        self.etag = self.make_etag(request)
+
+        # Last-Modified с точностью до секунды: если версия сменилась в
+        # текущую секунду, следующее изменение в ту же секунду не отличить.
+        # Такие страницы отдаем только с ETag. Пользователь входит в ETag,
+        # но не в дату, поэтому после входа дата не должна дать 304.
+        self.last_modified = None
+        if not user.is_authenticated and time.time() - latest / 1e9 >= 1:
+            self.last_modified = int(latest // 10 ** 9)
+
+    def make_etag(self, request):
+        parts = self.parts
+        if self.user.is_authenticated:
+            # Формы страницы подписаны CSRF-секретом, а он меняется при входе:
+            # копия из кэша браузера после повторного входа дала бы 403.
+            # Страница могла сама выдать секрет, поэтому finish() считает
+            # ETag заново.
+            parts = (*parts, request.META.get('CSRF_COOKIE'))
+        digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+        # Слабый ETag: страница содержит timesince и маскированный CSRF-токен,
+        # байты меняются при неизменных данных.
+        return f'W/"{digest}"'
+
+    def conditional_response(self, request):
+        return get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+
+    def finish(self, request, response):
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            response.headers.setdefault('ETag', self.make_etag(request))
+            if self.last_modified is not None:
+                response.headers.setdefault('Last-Modified', http_date(self.last_modified))
+        if self.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            # Анонимные страницы одинаковы для всех, их может держать прокси.
+            patch_cache_control(response, public=True, max_age=settings.ANONYMOUS_PAGE_MAX_AGE)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+
+def conditional_page(keys_func):
+    """Answer conditional GETs for a page before running the view.
+
+    ``keys_func(*args, **kwargs)`` gets the URL arguments of the view and
+    returns the version keys of everything the page shows. Works for sync
+    and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                state = await sync_to_async(PageState)(request, user, keys_func(*args, **kwargs))
+                response = state.conditional_response(request)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return state.finish(request, response)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            state = PageState(request, request.user, keys_func(*args, **kwargs))
+            response = state.conditional_response(request)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return state.finish(request, response)
+        return wrapper
+    return decorator
+
+
+def feed_keys():
+    return [versions.QUESTIONS_KEY, versions.ACTIVITY_KEY, versions.USERS_KEY]
+
+
+def tag_keys(tag_name):
+    # Голоса и ответы не привязаны к тегам, поэтому берем общую активность.
+    # Для /tag/a+b/ — версии каждого тега (и всего имени, если это один тег).
+    titles = sorted({tag_name, *filter(None, tag_name.split('+'))})
+    return [*map(versions.tag_key, titles), versions.ACTIVITY_KEY, versions.USERS_KEY]
+
+
+def question_keys(question_id):
+    return [versions.question_key(question_id), versions.activity_key(question_id), versions.USERS_KEY]
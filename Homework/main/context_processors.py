@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import leaderboards
+
+
+def sidebar(request):
+    # Ленивые объекты: страницы без сайдбара не трогают кэш и базу.
+    return {
+        'popular_tags': SimpleLazyObject(leaderboards.popular_tags),
+        'best_members': SimpleLazyObject(leaderboards.best_members),
+    }
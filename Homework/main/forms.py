@@ -1,6 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import User, Question, Tag, Answer
+from django.db import transaction
+from . import avatars, tag_index, versions
+from .models import User, Question, QuestionTag, Tag, Answer
+from .signals import change_tag_counts
 
 
 class SignUpForm(UserCreationForm):
@@ -18,6 +21,17 @@ class SignUpForm(UserCreationForm):
             raise forms.ValidationError("This email address is already registered.")
         return email
 
+    def save(self, commit=True):
+        user = super().save(commit=False)
+        # Файл сохраняется под хешем содержимого, а не под именем загрузки.
+        if self.cleaned_data.get('avatar'):
+            avatars.set_avatar(user, self.cleaned_data['avatar'])
+        if commit:
+            user.save()
+            self.save_m2m()
+            avatars.schedule_thumbnails(user)
+        return user
+
 
 
 class LoginForm(forms.Form):
@@ -32,23 +46,43 @@ class AskForm(forms.ModelForm):
         model = Question
         fields = ['title', 'text']
 
+    def clean_tags(self):
+        tags = self.cleaned_data.get('tags', '')
+        titles = list(dict.fromkeys(t.strip() for t in tags.split(',') if t.strip()))
+        max_length = Tag._meta.get_field('title').max_length
+        for title in titles:
+            if len(title) > max_length:
+                raise forms.ValidationError(f'Тег длиннее {max_length} символов: {title[:20]}...')
+        return titles
+
     def save(self, user, commit=True):
         question = super().save(commit=False)
         question.author = user
 
         if commit:
-            question.save()
-            self.process_tags(question)
+            with transaction.atomic():
+                question.save()
+                self.process_tags(question)
 
         return question
 
     def process_tags(self, question):
-        tags = self.cleaned_data.get('tags', '')
-        if tags:
-            tags_list = [t.strip() for t in tags.split(',') if t.strip()]
-            for tag_name in tags_list:
-                tag, _ = Tag.objects.get_or_create(title=tag_name)
-                question.tags.add(tag)
+        # Три запроса на все теги сразу: вставка новых (существующие
+        # пропускаются), выборка id и вставка связей. bulk_create не шлет
+        # m2m_changed, поэтому счетчики и версии обновляем здесь же.
+        titles = self.cleaned_data.get('tags')
+        if not titles:
+            return
+        Tag.objects.bulk_create([Tag(title=title) for title in titles], ignore_conflicts=True)
+        tags = list(Tag.objects.filter(title__in=titles))
+        QuestionTag.objects.bulk_create([
+            QuestionTag(question=question, tag=tag, created_at=question.created_at)
+            for tag in tags
+        ])
+        change_tag_counts([tag.pk for tag in tags], 1)
+        versions.bump(versions.question_key(question.pk), *[versions.tag_key(tag.title) for tag in tags])
+        # Только после коммита: откаченные теги не должны попасть в индекс.
+        transaction.on_commit(lambda: tag_index.add_tags(tags))
 
 
 class AnswerForm(forms.ModelForm):
@@ -62,6 +96,8 @@ class AnswerForm(forms.ModelForm):
         answer.question = question
 
         if commit:
-            answer.save()
+            # Счетчики вопроса и автора обновляет сигнал answer_saved.
+            with transaction.atomic():
+                answer.save()
 
         return answer
\ No newline at end of file
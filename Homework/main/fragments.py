@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from . import versions
+
+CARD_TEMPLATE = 'main/includes/question_card.html'
+CARD_TIMEOUT = 60 * 60
+VOTE_SLOT = mark_safe('<!--vote-buttons-->')
+
+
+def render_question_cards(questions):
+    """Set ``card_html`` on every question, rendering only cache misses.
+
+    The cached fragment depends on the question and its author only and is
+    keyed by both versions, so bumping either makes it unreachable. Vote
+    counts and the viewer's active buttons change on every vote, so they are
+    not part of the fragment and are filled into VOTE_SLOT per request.
+    """
+    if not questions:
+        return questions
+
+    keys = {}
+    for question in questions:
+        keys[question.id] = (versions.question_key(question.id), versions.user_key(question.author_id))
+    current = versions.get_many([key for pair in keys.values() for key in pair])
+
+    card_keys = {
+        question.id: 'card:{}:{}:{}'.format(
+            question.id, current[keys[question.id][0]], current[keys[question.id][1]]
+        )
+        for question in questions
+    }
+    cached = cache.get_many(card_keys.values())
+
+    # Теги нужны только для рендера промахов, для них и подгружаем.
+    misses = [question for question in questions if card_keys[question.id] not in cached]
+    prefetch_related_objects(misses, 'tags')
+    rendered = {}
+    for question in misses:
+        rendered[card_keys[question.id]] = render_to_string(
+            CARD_TEMPLATE,
+            {'question': question, 'vote_slot': VOTE_SLOT}
+        )
+    if rendered:
+        cache.set_many(rendered, CARD_TIMEOUT)
+        cached.update(rendered)
+
+    for question in questions:
+        html = cached[card_keys[question.id]]
+        question.card_html = mark_safe(html.replace(VOTE_SLOT, vote_buttons(question)))
+    return questions
+
+
+def vote_buttons(question):
+    return format_html(
+        '<div class="d-flex justify-content-center gap-1">'
+        '<button class="btn btn-outline-success btn-sm like-btn{}" data-id="{}">'
+        '👍 <span class="like-count">{}</span></button>'
+        '<button class="btn btn-outline-danger btn-sm dislike-btn{}" data-id="{}">'
+        '👎 <span class="dislike-count">{}</span></button>'
+        '</div>',
+        ' active' if getattr(question, 'is_liked', False) else '',
+        question.id,
+        question.likes_count,
+        ' active' if getattr(question, 'is_disliked', False) else '',
+        question.id,
+        question.dislikes_count,
+    )
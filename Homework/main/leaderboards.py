@@ -0,0 +1,29 @@
+from collections import namedtuple
+
+from .caching import get_or_refresh
+from .models import Tag, User
+
+POPULAR_TAGS_KEY = 'sidebar:popular_tags'
+BEST_MEMBERS_KEY = 'sidebar:best_members'
+TIMEOUT = 300
+
+PopularTag = namedtuple('PopularTag', ['title', 'questions_count'])
+BestMember = namedtuple('BestMember', ['username', 'answers_count'])
+
+
+def popular_tags():
+    rows = get_or_refresh(POPULAR_TAGS_KEY, build_popular_tags, TIMEOUT)
+    return [PopularTag(*row) for row in rows]
+
+
+def best_members():
+    rows = get_or_refresh(BEST_MEMBERS_KEY, build_best_members, TIMEOUT)
+    return [BestMember(*row) for row in rows]
+
+
+def build_popular_tags():
+    return list(Tag.objects.popular_tags().values_list('title', 'questions_count'))
+
+
+def build_best_members():
+    return list(User.objects.best_members().values_list('username', 'answers_count'))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from main import versions
+from main.models import Question
+import time
+
+
+class Command(BaseCommand):
+    help = 'Fills Question.preview for rows saved before the field existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of primary keys processed per batch')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every preview, not only empty ones')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        start_time = time.time()
+
+        questions = Question.objects.all()
+        if not options['all']:
+            questions = questions.filter(preview='')
+
+        bounds = questions.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write("Nothing to backfill")
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+            with transaction.atomic():
+                # Текст читаем только для текущего диапазона ключей.
+                rows = list(
+                    questions
+                    .filter(pk__gte=start, pk__lt=start + chunk_size)
+                    .only('id', 'text', 'preview')
+                )
+                changed = []
+                for question in rows:
+                    preview = Question.make_preview(question.text)
+                    if preview != question.preview:
+                        question.preview = preview
+                        changed.append(question)
+                Question.objects.bulk_update(changed, ['preview'])
+                versions.bump(*[versions.question_key(question.id) for question in changed])
+            updated += len(changed)
+        if updated:
+            versions.bump_pages()
+
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {updated} previews in {total_time:.2f} seconds"
+        ))
@@ -0,0 +1,252 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+import django
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from main import perf
+from main.models import Question, Tag, User
+
+SCENARIOS = ['index', 'hot_questions', 'tag', 'question', 'toggle_like', 'ask']
+# Какие сценарии выполняются от имени залогиненного пользователя.
+AUTHENTICATED = {'toggle_like', 'ask'}
+
+
+def percentile(values, fraction):
+    # Nearest-rank: значение, не меньше которого fraction всех замеров.
+    if not values:
+        return None
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return sorted(values)[min(index, len(values) - 1)]
+
+
+def mean(values):
+    if not values:
+        return None
+    return sum(values) / len(values)
+
+
+def ms(seconds):
+    # Пустой сценарий (все запросы с ошибкой или measure=0) — без замеров.
+    return None if seconds is None else perf.ms(seconds)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the main views on a throwaway database seeded by fill_db'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ratios', type=int, nargs='+', default=[10, 50],
+                            help='fill_db ratios to benchmark, one seeding per ratio')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20,
+                            help='Requests per scenario sent before measuring')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of client threads')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed for the data and the request mix')
+        parser.add_argument('--output', default='benchmark.json',
+                            help='Where to write the JSON report')
+        parser.add_argument('--compare', metavar='REPORT',
+                            help='Earlier JSON report to compare the results with')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as report:
+                    baseline = json.load(report)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        report = {
+            'meta': {
+                'revision': git_revision(),
+                'date': datetime.now(dt_timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+            },
+            'results': {},
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            old_name = self.create_database(directory)
+            setup_test_environment()
+            try:
+                # Медленные запросы здесь ожидаемы, их предупреждения только мешают выводу.
+                with override_settings(PERF_ENABLED=True, PERF_SLOW_REQUEST_MS=float('inf'),
+                                       VOTE_BUFFER_FLUSH_INTERVAL=None):
+                    for ratio in options['ratios']:
+                        report['results'][str(ratio)] = self.run_ratio(ratio, options)
+            finally:
+                teardown_test_environment()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+        if baseline is not None:
+            self.compare(baseline, report)
+
+    def create_database(self, directory):
+        # Тестовая SQLite по умолчанию живет в памяти; для нескольких потоков
+        # с записью нужен настоящий файл.
+        if connection.vendor == 'sqlite':
+            if not connection.settings_dict['TEST'].get('NAME'):
+                connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            # Пишущие потоки ждут блокировку, а не падают с "database is locked".
+            connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+            connection.settings_dict['OPTIONS'].setdefault('transaction_mode', 'IMMEDIATE')
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    def run_ratio(self, ratio, options):
+        self.stdout.write(f"Seeding ratio {ratio}...")
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('fill_db', ratio, seed=options['seed'], stdout=StringIO())
+        for cache in caches.all():
+            cache.clear()
+
+        fixtures = {
+            'users': list(User.objects.order_by('id').values_list('id', flat=True)[:options['concurrency']]),
+            'questions': list(Question.objects.values_list('id', flat=True)),
+            'tags': list(Tag.objects.order_by('-questions_count').values_list('title', flat=True)[:20]),
+        }
+
+        results = {}
+        for scenario in options['scenarios']:
+            result = self.run_scenario(scenario, fixtures, options)
+            results[scenario] = result
+            self.stdout.write(
+                f"  {scenario:<14} p50 {result['p50_ms']!s:>8} ms  p95 {result['p95_ms']!s:>8} ms  "
+                f"p99 {result['p99_ms']!s:>8} ms  {result['throughput_rps']:>8} req/s  "
+                f"{result['queries_per_request']} queries  {result['errors']} errors"
+            )
+        return results
+
+    def run_scenario(self, scenario, fixtures, options):
+        concurrency = options['concurrency']
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(number, count, measure):
+            client = Client()
+            rng = random.Random(options['seed'] * 1000 + number)
+            if scenario in AUTHENTICATED:
+                client.force_login(User.objects.get(pk=fixtures['users'][number % len(fixtures['users'])]))
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    try:
+                        response = self.send(client, scenario, fixtures, rng)
+                        failed = response.status_code >= 400
+                    except Exception:
+                        failed = True
+                    elapsed = time.perf_counter() - start
+                    if measure:
+                        with lock:
+                            latencies.append(elapsed)
+                            if failed:
+                                errors.append(scenario)
+            finally:
+                connections.close_all()
+
+        self.run_threads(worker, options['warmup'], concurrency, measure=False)
+        perf.reset()
+        start = time.perf_counter()
+        self.run_threads(worker, options['requests'], concurrency, measure=True)
+        wall_time = time.perf_counter() - start
+
+        route = perf.summary().get(scenario, {})
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'p50_ms': ms(percentile(latencies, 0.50)),
+            'p95_ms': ms(percentile(latencies, 0.95)),
+            'p99_ms': ms(percentile(latencies, 0.99)),
+            'mean_ms': ms(mean(latencies)),
+            'throughput_rps': round(len(latencies) / wall_time, 1) if wall_time else 0.0,
+            'queries_per_request': route.get('avg_queries'),
+            'sql_ms_per_request': route.get('avg_sql_ms'),
+        }
+
+    @staticmethod
+    def run_threads(worker, total, concurrency, measure):
+        counts = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+        threads = [
+            threading.Thread(target=worker, args=(number, count, measure))
+            for number, count in enumerate(counts) if count
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def send(client, scenario, fixtures, rng):
+        if scenario == 'index':
+            return client.get(reverse('index'))
+        if scenario == 'hot_questions':
+            return client.get(reverse('hot_questions'))
+        if scenario == 'tag':
+            return client.get(reverse('tag', args=[rng.choice(fixtures['tags'])]))
+        if scenario == 'question':
+            return client.get(reverse('question', args=[rng.choice(fixtures['questions'])]))
+        if scenario == 'toggle_like':
+            return client.post(reverse('toggle_like'), {'id': rng.choice(fixtures['questions'])})
+        return client.post(reverse('ask'), {
+            'title': f'Benchmark question {rng.random()}',
+            'text': 'Benchmark question text',
+            'tags': ', '.join(rng.sample(fixtures['tags'], min(3, len(fixtures['tags'])))),
+        })
+
+    def compare(self, baseline, report):
+        self.stdout.write(
+            f"\nCompared with {baseline['meta'].get('revision')} "
+            f"({baseline['meta'].get('database')}):"
+        )
+        for ratio, scenarios in report['results'].items():
+            for scenario, current in scenarios.items():
+                previous = baseline.get('results', {}).get(ratio, {}).get(scenario)
+                if previous is None:
+                    continue
+                self.stdout.write(
+                    f"  ratio {ratio:<5} {scenario:<14} "
+                    f"p95 {self.change(previous['p95_ms'], current['p95_ms'])}  "
+                    f"req/s {self.change(previous['throughput_rps'], current['throughput_rps'])}  "
+                    f"queries {previous['queries_per_request']} -> {current['queries_per_request']}"
+                )
+
+    @staticmethod
+    def change(before, after):
+        if not before or after is None:
+            return f'{before} -> {after}'
+        return f'{before} -> {after} ({(after - before) / before * 100:+.1f}%)'
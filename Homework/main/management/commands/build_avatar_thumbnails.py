@@ -0,0 +1,41 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from main import avatars
+from main.models import User
+import time
+
+
+class Command(BaseCommand):
+    help = 'Makes avatar thumbnails that are missing, e.g. for avatars uploaded before them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rename', action='store_true',
+                            help='Also move old avatars to content-hash names')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        users = User.objects.exclude(avatar='').exclude(avatar__isnull=True) \
+            .filter(avatar_thumbnails=False).only('id', 'avatar', 'avatar_thumbnails')
+
+        built = failed = 0
+        for user in users.iterator():
+            name = user.avatar.name
+            if options['rename']:
+                try:
+                    with avatars.storage().open(name) as source:
+                        name = avatars.store_original(File(source, name=name))
+                except OSError:
+                    self.stderr.write(f"Avatar file {name} of user {user.pk} is missing")
+                    failed += 1
+                    continue
+                if name != user.avatar.name:
+                    User.objects.filter(pk=user.pk).update(avatar=name)
+            if avatars.build_thumbnails(user.pk, name):
+                built += 1
+            else:
+                failed += 1
+
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"Built thumbnails for {built} avatars ({failed} failed) in {total_time:.2f} seconds"
+        ))
@@ -1,11 +1,38 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction, connection
-from django.utils import timezone
-from main.models import User, Tag, Question, Answer
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+import hashlib
+import math
+import multiprocessing
 import random
 import time
-import math
-from datetime import timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from main import bulk_load
+from main.models import User, Tag, Question, QuestionTag, Answer, Vote
+
+PASSWORD = 'password123'
+TAGS_PER_QUESTION = 5
+DAYS_BACK = 365
+# Точка отсчета дат при заданном --seed, чтобы данные не зависели от дня запуска.
+SEED_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+# Сколько строк генерирует одна задача. Разбиение не зависит от --workers,
+# поэтому один и тот же seed дает одни и те же данные при любом числе процессов.
+BLOCK_SIZES = {
+    'users': 10000,
+    'tags': 10000,
+    'questions': 2000,
+    'answers': 20000,
+    'votes': 1000,
+}
+# Этапы выполняются по очереди: строки, на которые ссылаются внешние ключи,
+# должны быть закоммичены до того, как их увидят другие процессы.
+PHASES = [('users', 'tags'), ('questions',), ('answers', 'votes')]
 
 
 class Command(BaseCommand):
@@ -13,157 +40,188 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('ratio', type=int, help='Fill ratio coefficient')
+        parser.add_argument('--batch-size', type=int, default=bulk_load.BATCH_SIZE,
+                            help='Rows per INSERT batch when COPY is not available')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes generating and writing rows')
+        parser.add_argument('--seed', type=int,
+                            help='Seed for a reproducible dataset (random by default)')
 
     def handle(self, *args, **options):
         ratio = options['ratio']
+        workers = max(options['workers'], 1)
+        seed = options['seed']
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+            now = timezone.now()
+        else:
+            now = SEED_EPOCH
         start_time = time.time()
 
-        # Создаем пользователей
-        self.stdout.write(f"Creating {ratio} users...")
-        users = self.create_users(ratio)
-
-        # Создаем теги
-        self.stdout.write(f"Creating {ratio} tags...")
-        tags = self.create_tags(ratio)
-
-        # Создаем вопросы
-        self.stdout.write(f"Creating {ratio * 10} questions...")
-        questions = self.create_questions(ratio, users, tags)
-
-        # Создаем ответы
-        self.stdout.write(f"Creating {ratio * 100} answers...")
-        self.create_answers(ratio, users, questions)
+        plan = Plan(ratio, seed, now, options['batch_size'])
+        self.stdout.write(f"Seed {seed}, {workers} worker(s)")
+        self.stdout.write(
+            f"Creating {len(plan.users)} users, {len(plan.tags)} tags, "
+            f"{len(plan.questions)} questions, {len(plan.answers)} answers "
+            f"and about {plan.votes} ratings..."
+        )
+
+        if workers == 1:
+            for phase in PHASES:
+                for task in plan.tasks(phase):
+                    run_task(task)
+        else:
+            # Дочерние процессы открывают свои соединения; унаследованные
+            # закрываем заранее, иначе процессы делили бы один сокет.
+            connections.close_all()
+            context = multiprocessing.get_context(
+                'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+            )
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=django.setup) as pool:
+                for phase in PHASES:
+                    list(pool.map(run_task, plan.tasks(phase)))
 
-        # Создаем оценки
-        self.stdout.write(f"Creating {ratio * 200} ratings...")
-        self.create_ratings(ratio, users, questions)
+        bulk_load.reset_sequences(User, Tag, Question, QuestionTag, Answer, Vote)
 
         # Обновляем счетчики
         self.stdout.write("Updating counters...")
-        self.update_counters(tags, questions)
+        self.update_counters()
 
         total_time = time.time() - start_time
         self.stdout.write(self.style.SUCCESS(
             f"Successfully filled database in {total_time:.2f} seconds"
         ))
 
-    def create_users(self, ratio):
-        users = []
-        for i in range(ratio):
-            user = User(
-                username=f'user_{i}',
-                email=f'user_{i}@example.com',
-                nickname=f'nickname_{i}',
-            )
-            user.set_password('password123')
-            users.append(user)
-        return User.objects.bulk_create(users)
-
-    def create_tags(self, ratio):
-        tags = []
-        for i in range(ratio):
-            tags.append(Tag(title=f'tag_{i}'))
-        return Tag.objects.bulk_create(tags)
-
-    def create_questions(self, ratio, users, tags):
-        batch_size = 5000
-        total = ratio * 10
-        questions = []
-
-        for i in range(total):
-            author = random.choice(users)
-            question = Question(
-                title=f'Question {i}',
-                text=f'Text of question {i}',
-                author=author,
-                created_at=timezone.now() - timedelta(days=random.randint(0, 365)),
-            )
-            questions.append(question)
-
-        # Создаем вопросы пакетами
-        created_questions = []
-        for i in range(0, len(questions), batch_size):
-            batch = questions[i:i + batch_size]
-            created_questions.extend(Question.objects.bulk_create(batch))
-
-        # Добавляем теги к вопросам
-        self.add_tags_to_questions(created_questions, tags)
-        return created_questions
-
-    def add_tags_to_questions(self, questions, tags):
-        question_tags = []
-        through_model = Question.tags.through
-
-        for question in questions:
-            selected_tags = random.sample(list(tags), min(5, len(tags)))
-            for tag in selected_tags:
-                question_tags.append(through_model(question_id=question.id, tag_id=tag.id))
-
-        # Вставляем связи пакетами
-        batch_size = 10000
-        for i in range(0, len(question_tags), batch_size):
-            through_model.objects.bulk_create(question_tags[i:i + batch_size])
-
-    def create_answers(self, ratio, users, questions):
-        batch_size = 10000
-        total = ratio * 100
-        answers = []
-
-        for i in range(total):
-            question = random.choice(questions)
-            author = random.choice(users)
-            answer = Answer(
-                text=f'Answer {i} to question {question.id}',
-                author=author,
-                question=question,
-                created_at=timezone.now() - timedelta(days=random.randint(0, 365)),
-                is_correct=random.choice([True, False]),
+    def update_counters(self):
+        # Счетчики вопросов, тегов и пользователей одним UPDATE на пачку строк
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rescore_hot', all=True, stdout=self.stdout)
+
+
+class Plan:
+    """Id ranges of every table and the blocks they are generated in.
+
+    Users, tags, questions and answers get contiguous ids after the current
+    maximum. Votes and question-tag links get a fixed number of ids per
+    question (``max_voters`` and TAGS_PER_QUESTION), so a block of questions
+    knows its ids without looking at the other blocks.
+    """
+
+    def __init__(self, ratio, seed, now, batch_size):
+        self.seed = seed
+        self.now = now
+        self.batch_size = batch_size
+        # Соль из seed, иначе хеш пароля был бы единственным отличием двух
+        # прогонов. Длина 32, чтобы Django не считал соль слабой и не
+        # перехешировал пароль при первом входе.
+        salt = hashlib.sha256(f'fill_db:{seed}'.encode()).hexdigest()[:32]
+        self.password = make_password(PASSWORD, salt=salt)
+
+        self.users = id_range(User, ratio)
+        self.tags = id_range(Tag, ratio)
+        self.questions = id_range(Question, ratio * 10)
+        self.answers = id_range(Answer, ratio * 100)
+        # ratio * 200 оценок, но не больше, чем пар (пользователь, вопрос).
+        self.votes = min(ratio * 200, len(self.users) * len(self.questions))
+        self.voters_per_question = self.votes / len(self.questions) if self.questions else 0
+        self.max_voters = math.ceil(self.voters_per_question)
+        self.first_vote = bulk_load.next_id(Vote)
+        self.first_link = bulk_load.next_id(QuestionTag)
+
+    def tasks(self, phase):
+        for kind in phase:
+            rows = self.questions if kind == 'votes' else getattr(self, kind)
+            size = BLOCK_SIZES[kind]
+            for start in range(0, len(rows), size):
+                yield self, kind, rows[start:start + size]
+
+
+def id_range(model, count):
+    first = bulk_load.next_id(model)
+    return range(first, first + count)
+
+
+def run_task(task):
+    plan, kind, block = task
+    # Свой генератор на каждый блок: результат не зависит от того, какой
+    # процесс и в каком порядке выполнил задачу.
+    rng = random.Random(f'{plan.seed}:{kind}:{block.start}')
+    GENERATORS[kind](plan, block, rng)
+
+
+def random_date(plan, rng):
+    return plan.now - timedelta(seconds=rng.randint(0, DAYS_BACK * 86400))
+
+
+def create_users(plan, block, rng):
+    # PBKDF2 считается один раз в Plan: у всех тестовых пользователей один пароль.
+    bulk_load.load(User, ('id', 'username', 'email', 'nickname', 'password', 'date_joined'), (
+        (i, f'user_{i}', f'user_{i}@example.com', f'nickname_{i}', plan.password, plan.now)
+        for i in block
+    ), plan.batch_size)
+
+
+def create_tags(plan, block, rng):
+    bulk_load.load(Tag, ('id', 'title'), ((i, f'tag_{i}') for i in block), plan.batch_size)
+
+
+def create_questions(plan, block, rng):
+    questions = []
+    links = []
+    for i in block:
+        text = f'Text of question {i}'
+        created_at = random_date(plan, rng)
+        questions.append((
+            i, f'Question {i}', text, Question.make_preview(text),
+            rng.choice(plan.users), created_at, created_at,
+        ))
+        # Добавляем теги к вопросу
+        first_link = plan.first_link + (i - plan.questions.start) * TAGS_PER_QUESTION
+        tags = rng.sample(plan.tags, min(TAGS_PER_QUESTION, len(plan.tags)))
+        links.extend((first_link + j, i, tag_id, created_at) for j, tag_id in enumerate(tags))
+
+    bulk_load.load(Question, ('id', 'title', 'text', 'preview', 'author', 'created_at', 'updated_at'),
+                   questions, plan.batch_size)
+    bulk_load.load(QuestionTag, ('id', 'question', 'tag', 'created_at'), links, plan.batch_size)
+
+
+def create_answers(plan, block, rng):
+    def rows():
+        for i in block:
+            question_id = rng.choice(plan.questions)
+            created_at = random_date(plan, rng)
+            yield (
+                i, f'Answer {i} to question {question_id}', rng.choice(plan.users),
+                question_id, rng.random() < 0.5, created_at, created_at,
             )
-            answers.append(answer)
-
-        # Создаем ответы пакетами
-        for i in range(0, len(answers), batch_size):
-            Answer.objects.bulk_create(answers[i:i + batch_size])
-
-    def create_ratings(self, ratio, users, questions):
-        total_ratings = ratio * 200
-        ratings_set = set()
-        likes_list = []
-        dislikes_list = []
-
-        # Генерируем уникальные оценки
-        while len(ratings_set) < total_ratings:
-            user = random.choice(users)
-            question = random.choice(questions)
-            key = (user.id, question.id)
-
-            if key not in ratings_set:
-                ratings_set.add(key)
-                if random.choice([True, False]):
-                    likes_list.append(question.likes.through(user_id=user.id, question_id=question.id))
-                else:
-                    dislikes_list.append(question.dislikes.through(user_id=user.id, question_id=question.id))
-
-        # Создаем лайки и дизлайки
-        batch_size = 10000
-        self.create_bulk_ratings(likes_list, batch_size)
-        self.create_bulk_ratings(dislikes_list, batch_size)
-
-    def create_bulk_ratings(self, ratings, batch_size):
-        for i in range(0, len(ratings), batch_size):
-            batch = ratings[i:i + batch_size]
-            model = batch[0].__class__ if batch else None
-            if model:
-                model.objects.bulk_create(batch)
-
-    def update_counters(self, tags, questions):
-        # Обновляем счетчики тегов
-        for tag in tags:
-            tag.num_questions = tag.questions.count()
-            tag.save()
-
-        # Обновляем счетчики вопросов
-        for question in questions:
-            question.likes_count = question.likes.count()
-            question.dislikes_count = question.dislikes.count()
-            question.save()
\ No newline at end of file
+
+    bulk_load.load(Answer, ('id', 'text', 'author', 'question', 'is_correct', 'created_at', 'updated_at'),
+                   rows(), plan.batch_size)
+
+
+def create_ratings(plan, block, rng):
+    # Уникальность (пользователь, вопрос) обеспечивается выборкой без
+    # повторов внутри каждого вопроса, без множества всех пар в памяти.
+    def rows():
+        for question_id in block:
+            first_vote = plan.first_vote + (question_id - plan.questions.start) * plan.max_voters
+            # Дробная часть среднего — вероятностью лишнего голоса, так что
+            # в сумме выходит plan.votes.
+            whole = int(plan.voters_per_question)
+            voters = whole + (rng.random() < plan.voters_per_question - whole)
+            for j, user_id in enumerate(rng.sample(plan.users, voters)):
+                yield (
+                    first_vote + j, user_id, question_id,
+                    rng.choice([Vote.LIKE, Vote.DISLIKE]), random_date(plan, rng),
+                )
+
+    bulk_load.load(Vote, ('id', 'user', 'question', 'value', 'created_at'), rows(), plan.batch_size)
+
+
+GENERATORS = {
+    'users': create_users,
+    'tags': create_tags,
+    'questions': create_questions,
+    'answers': create_answers,
+    'votes': create_ratings,
+}
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from main import vote_buffer
+import time
+
+
+class Command(BaseCommand):
+    help = 'Merges buffered like/dislike counter deltas into Question rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running and flush every N seconds')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            applied = vote_buffer.flush()
+            self.stdout.write(f"Applied {applied} buffered vote changes")
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from main import versions, vote_buffer
+from main.models import Question, Answer, Vote
+from main.ranking import hot_score_expression
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Question.hot_score from the counters for recently active questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help='A question is active if it was asked, answered or voted on within this window')
+        parser.add_argument('--all', action='store_true',
+                            help='Rescore every question, e.g. after changing the weights in main.ranking')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of primary keys processed per UPDATE')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        if vote_buffer.enabled():
+            # Счет берется из счетчиков, в которые журнал еще не слит.
+            vote_buffer.flush()
+
+        questions = Question.objects.all()
+        if not options['all']:
+            # Счет меняется инкрементально при каждом голосе и ответе; здесь
+            # только исправляем расхождения (сброшенный буфер голосов,
+            # reconcile_counters) у вопросов, которые еще могут попасть в ленту.
+            since = timezone.now() - timedelta(hours=options['hours'])
+            questions = questions.filter(
+                Q(created_at__gte=since)
+                | Q(pk__in=Vote.objects.filter(created_at__gte=since).values('question_id'))
+                | Q(pk__in=Answer.objects.filter(created_at__gte=since).values('question_id'))
+            )
+
+        bounds = questions.aggregate(low=Min('pk'), high=Max('pk'))
+        rescored = 0
+        if bounds['low'] is not None:
+            chunk_size = options['chunk_size']
+            for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+                with transaction.atomic():
+                    rescored += questions \
+                        .filter(pk__gte=start, pk__lt=start + chunk_size) \
+                        .update(hot_score=hot_score_expression())
+        versions.bump_pages()
+
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {rescored} questions in {total_time:.2f} seconds"
+        ))
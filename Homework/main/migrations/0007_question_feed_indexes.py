@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_alter_user_options_question_dislikes_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='question',
+            name='main_questi_created_421617_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='question',
+            name='main_questi_likes_c_e7e687_idx',
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-created_at', '-id'], name='main_questi_created_5344d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-likes_count', '-created_at', '-id'], name='main_questi_likes_c_ff580a_idx'),
+        ),
+    ]
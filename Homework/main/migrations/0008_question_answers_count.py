@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_question_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql='UPDATE main_question SET answers_count = ('
+                'SELECT COUNT(*) FROM main_answer WHERE main_answer.question_id = main_question.id'
+                ')',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-answers_count', '-created_at', '-id'], name='main_questi_answers_d639f2_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0008_question_answers_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='questions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='answers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql=[
+                'UPDATE main_tag SET questions_count = ('
+                'SELECT COUNT(*) FROM main_question_tags WHERE main_question_tags.tag_id = main_tag.id'
+                ')',
+                'UPDATE main_user SET answers_count = ('
+                'SELECT COUNT(*) FROM main_answer WHERE main_answer.author_id = main_user.id'
+                ')',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-questions_count'], name='main_tag_questio_8c7855_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-answers_count'], name='main_user_answers_3321a1_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_leaderboard_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.SmallIntegerField(choices=[(1, 'Like'), (-1, 'Dislike')])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('question', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='main.question')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='votes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'value'], name='main_vote_questio_43a1bb_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'question'), name='main_vote_user_question_uniq')],
+            },
+        ),
+        migrations.RunSQL(
+            sql=[
+                'INSERT INTO main_vote (user_id, question_id, value, created_at) '
+                'SELECT user_id, question_id, 1, CURRENT_TIMESTAMP FROM main_question_likes',
+                'INSERT INTO main_vote (user_id, question_id, value, created_at) '
+                'SELECT d.user_id, d.question_id, -1, CURRENT_TIMESTAMP FROM main_question_dislikes d '
+                'WHERE NOT EXISTS ('
+                'SELECT 1 FROM main_vote v WHERE v.user_id = d.user_id AND v.question_id = d.question_id'
+                ')',
+            ],
+            reverse_sql=[
+                'INSERT INTO main_question_likes (question_id, user_id) '
+                'SELECT question_id, user_id FROM main_vote WHERE value = 1',
+                'INSERT INTO main_question_dislikes (question_id, user_id) '
+                'SELECT question_id, user_id FROM main_vote WHERE value = -1',
+            ],
+        ),
+    ]
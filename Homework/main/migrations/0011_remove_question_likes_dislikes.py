@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_vote'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='question',
+            name='dislikes',
+        ),
+        migrations.RemoveField(
+            model_name='question',
+            name='likes',
+        ),
+    ]
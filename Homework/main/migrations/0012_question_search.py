@@ -0,0 +1,69 @@
+from django.db import OperationalError, migrations
+
+POSTGRESQL_FORWARD = [
+    "ALTER TABLE main_question ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(text, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX main_question_search_idx ON main_question USING GIN (search_vector)",
+]
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS main_question_search_idx",
+    "ALTER TABLE main_question DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE main_question_fts USING fts5("
+    "title, text, content='main_question', content_rowid='id', tokenize='porter unicode61'"
+    ")",
+    "CREATE TRIGGER main_question_fts_ai AFTER INSERT ON main_question BEGIN "
+    "INSERT INTO main_question_fts(rowid, title, text) VALUES (new.id, new.title, new.text); "
+    "END",
+    "CREATE TRIGGER main_question_fts_ad AFTER DELETE ON main_question BEGIN "
+    "INSERT INTO main_question_fts(main_question_fts, rowid, title, text) "
+    "VALUES ('delete', old.id, old.title, old.text); "
+    "END",
+    "CREATE TRIGGER main_question_fts_au AFTER UPDATE OF title, text ON main_question BEGIN "
+    "INSERT INTO main_question_fts(main_question_fts, rowid, title, text) "
+    "VALUES ('delete', old.id, old.title, old.text); "
+    "INSERT INTO main_question_fts(rowid, title, text) VALUES (new.id, new.title, new.text); "
+    "END",
+    "INSERT INTO main_question_fts(main_question_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS main_question_fts_ai",
+    "DROP TRIGGER IF EXISTS main_question_fts_ad",
+    "DROP TRIGGER IF EXISTS main_question_fts_au",
+    "DROP TABLE IF EXISTS main_question_fts",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            for statement in statements['postgresql']:
+                schema_editor.execute(statement)
+        elif vendor == 'sqlite':
+            try:
+                for statement in statements['sqlite']:
+                    schema_editor.execute(statement)
+            except OperationalError:
+                # SQLite собран без FTS5: поиск работает через запасной вариант.
+                pass
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_remove_question_likes_dislikes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_statements({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_answer_thread_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+# Формула из main.ranking на момент миграции.
+BACKFILL_SQL = {
+    'postgresql': (
+        "UPDATE main_question SET hot_score = "
+        "(likes_count - dislikes_count) * 1.0 + answers_count * 2.0 "
+        "+ FLOOR(EXTRACT(EPOCH FROM created_at)) / 3600"
+    ),
+    'sqlite': (
+        "UPDATE main_question SET hot_score = "
+        "(likes_count - dislikes_count) * 1.0 + answers_count * 2.0 "
+        "+ CAST(strftime('%s', created_at) AS REAL) / 3600"
+    ),
+}
+
+
+def backfill_hot_score(apps, schema_editor):
+    sql = BACKFILL_SQL.get(schema_editor.connection.vendor)
+    if sql is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_question_preview'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='question',
+            name='main_questi_likes_c_ff580a_idx',
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_hot_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-hot_score', '-id'], name='main_questi_hot_sco_d37a9a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['created_at'], name='main_vote_created_268e73_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# Таблица main_question_tags остается той же, в ней только появляются копии
+# created_at и likes_count вопроса.
+BACKFILL_SQL = {
+    'postgresql': (
+        "UPDATE main_question_tags AS qt SET created_at = q.created_at, likes_count = q.likes_count "
+        "FROM main_question AS q WHERE q.id = qt.question_id"
+    ),
+    'sqlite': (
+        "UPDATE main_question_tags SET "
+        "created_at = (SELECT created_at FROM main_question WHERE id = main_question_tags.question_id), "
+        "likes_count = (SELECT likes_count FROM main_question WHERE id = main_question_tags.question_id)"
+    ),
+}
+
+
+def backfill_postings(apps, schema_editor):
+    sql = BACKFILL_SQL.get(schema_editor.connection.vendor)
+    if sql is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_updated_at'),
+    ]
+
+    operations = [
+        # Автоматическая промежуточная таблица становится моделью QuestionTag
+        # без пересоздания: меняется только состояние миграций.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='QuestionTag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.question')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.tag')),
+                    ],
+                    options={
+                        'db_table': 'main_question_tags',
+                        'unique_together': {('question', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='question',
+                    name='tags',
+                    field=models.ManyToManyField(related_name='questions', through='main.QuestionTag', to='main.tag'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='questiontag',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='questiontag',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_postings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='questiontag',
+            index=models.Index(fields=['tag', '-created_at', '-question'], name='main_questi_tag_id_1a3712_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questiontag',
+            index=models.Index(fields=['tag', '-likes_count', '-question'], name='main_questi_tag_id_8e1d60_idx'),
+        ),
+    ]
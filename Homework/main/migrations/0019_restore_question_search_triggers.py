@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# SQLite не умеет добавлять NOT NULL колонку без пересоздания таблицы, и
+# миграции 0014-0016 пересоздали main_question вместе с триггерами FTS из
+# 0012 — без них. Создаем триггеры заново и перестраиваем индекс, чтобы в нем
+# оказались вопросы, добавленные и измененные после этого. После каждого
+# migrate то же проверяет signals.restore_search_triggers.
+SQLITE_FORWARD = [
+    "DROP TRIGGER IF EXISTS main_question_fts_ai",
+    "DROP TRIGGER IF EXISTS main_question_fts_ad",
+    "DROP TRIGGER IF EXISTS main_question_fts_au",
+    "CREATE TRIGGER main_question_fts_ai AFTER INSERT ON main_question BEGIN "
+    "INSERT INTO main_question_fts(rowid, title, text) VALUES (new.id, new.title, new.text); "
+    "END",
+    "CREATE TRIGGER main_question_fts_ad AFTER DELETE ON main_question BEGIN "
+    "INSERT INTO main_question_fts(main_question_fts, rowid, title, text) "
+    "VALUES ('delete', old.id, old.title, old.text); "
+    "END",
+    "CREATE TRIGGER main_question_fts_au AFTER UPDATE OF title, text ON main_question BEGIN "
+    "INSERT INTO main_question_fts(main_question_fts, rowid, title, text) "
+    "VALUES ('delete', old.id, old.title, old.text); "
+    "INSERT INTO main_question_fts(rowid, title, text) VALUES (new.id, new.title, new.text); "
+    "END",
+    "INSERT INTO main_question_fts(main_question_fts) VALUES ('rebuild')",
+]
+
+
+def restore_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    # На PostgreSQL search_vector — генерируемая колонка, она пережила
+    # миграции; SQLite без FTS5 таблицы не создавал.
+    if connection.vendor != 'sqlite':
+        return
+    if 'main_question_fts' not in connection.introspection.table_names():
+        return
+    for statement in SQLITE_FORWARD:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_avatar_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,26 @@
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.base_user import BaseUserManager
 from django.db import models
-from django.db.models import Count
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from . import ranking
+
+# Длина превью вопроса в ленте, в символах.
+PREVIEW_LENGTH = 200
 
 
 class TagManager(models.Manager):
     def popular_tags(self):
-        return self.annotate(num_questions=Count('questions'))\
-                   .order_by('-num_questions')[:10]
+        return self.only('id', 'title', 'questions_count') \
+                   .order_by('-questions_count')[:10]
 
 
 class UserManager(BaseUserManager):
     def best_members(self):
-        return self.annotate(num_answers=Count('answers')) \
-                   .order_by('-num_answers')[:10]
+        return self.only('id', 'username', 'answers_count') \
+                   .order_by('-answers_count')[:10]
 
     def create_user(self, username, email, password=None, **extra_fields):
         if not email:
@@ -45,12 +52,16 @@ class User(AbstractUser):
         null=True,
         verbose_name='Аватар'
     )
+    # Миниатюры текущего аватара готовы (см. main.avatars).
+    avatar_thumbnails = models.BooleanField(default=False)
+    answers_count = models.PositiveIntegerField(default=0)
     objects = UserManager()
 
     class Meta:
         indexes = [
             models.Index(fields=['username']),
             models.Index(fields=['email']),
+            models.Index(fields=['-answers_count']),
         ]
 
     def __str__(self):
@@ -59,44 +70,127 @@ class User(AbstractUser):
 
 class Tag(models.Model):
     title = models.CharField(max_length=50, unique=True)
+    questions_count = models.PositiveIntegerField(default=0)
     objects = TagManager()
 
     class Meta:
         indexes = [
             models.Index(fields=['title']),
+            models.Index(fields=['-questions_count']),
         ]
 
     def __str__(self):
         return self.title
 
 
+class QuestionManager(models.Manager):
+    def search(self, query, limit=20, offset=0):
+        from .search import search
+
+        hits = search(self.model, query, limit, offset)
+        questions = self.defer('text').select_related('author') \
+            .prefetch_related('tags') \
+            .in_bulk([hit.id for hit in hits])
+
+        results = []
+        for hit in hits:
+            question = questions.get(hit.id)
+            if question is not None:
+                question.rank = hit.rank
+                question.title_highlight = hit.title
+                question.snippet = hit.snippet
+                results.append(question)
+        return results
+
+
 class Question(models.Model):
     title = models.CharField(max_length=100)
     text = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='questions')
-    tags = models.ManyToManyField('Tag', related_name='questions')
+    tags = models.ManyToManyField('Tag', through='QuestionTag', related_name='questions')
     created_at = models.DateTimeField(auto_now_add=True)
-
-    likes = models.ManyToManyField(User, related_name='liked_questions', blank=True)
-    dislikes = models.ManyToManyField(User, related_name='disliked_questions', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     likes_count = models.PositiveIntegerField(default=0, db_index=True)
     dislikes_count = models.PositiveIntegerField(default=0, db_index=True)
+    answers_count = models.PositiveIntegerField(default=0)
+    preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, editable=False)
+    hot_score = models.FloatField(default=0, editable=False)
+    objects = QuestionManager()
 
     def __str__(self):
         return self.title
 
+    @staticmethod
+    def make_preview(text):
+        # Схлопываем пробелы и переносы; многоточие входит в PREVIEW_LENGTH.
+        return Truncator(' '.join(text.split())).chars(PREVIEW_LENGTH)
+
+    def save(self, *args, **kwargs):
+        self.preview = self.make_preview(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'preview'}
+        if update_fields is None:
+            # Полное сохранение пишет и счетчики, счет считаем по ним же.
+            self.hot_score = ranking.hot_score(
+                self.likes_count, self.dislikes_count, self.answers_count, self.created_at
+            )
+        super().save(*args, **kwargs)
+
     def total_likes(self):
-        return self.likes.count()
+        return self.likes_count
 
     def total_dislikes(self):
-        return self.dislikes.count()
+        return self.dislikes_count
 
     class Meta:
         indexes = [
-            models.Index(fields=['created_at']),
-            models.Index(fields=['likes_count']),
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['-hot_score', '-id']),
             models.Index(fields=['dislikes_count']),
+            models.Index(fields=['-answers_count', '-created_at', '-id']),
+        ]
+
+
+class QuestionTagManager(models.Manager):
+    def intersection(self, tags):
+        """Postings of the questions that carry every tag of ``tags``.
+
+        The list of the rarest tag is scanned in feed order through its
+        ``(tag, ...)`` index; for each row the other tags are probed in the
+        ``(question, tag)`` unique index, so the cost follows the rarest tag
+        rather than the most popular one.
+        """
+        rarest = min(tags, key=lambda tag: tag.questions_count)
+        postings = self.filter(tag=rarest)
+        for tag in tags:
+            if tag.pk != rarest.pk:
+                postings = postings.filter(
+                    Exists(self.filter(tag=tag, question_id=OuterRef('question_id')))
+                )
+        return postings
+
+
+class QuestionTag(models.Model):
+    """A question in the list of one of its tags.
+
+    ``created_at`` and ``likes_count`` are copies of the question's columns,
+    so a tag feed is read from the ``(tag, ...)`` indexes of this table
+    without joining and sorting every question of the tag.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now)
+    likes_count = models.PositiveIntegerField(default=0)
+    objects = QuestionTagManager()
+
+    class Meta:
+        db_table = 'main_question_tags'
+        unique_together = [('question', 'tag')]
+        indexes = [
+            models.Index(fields=['tag', '-created_at', '-question']),
+            models.Index(fields=['tag', '-likes_count', '-question']),
         ]
 
 
@@ -110,13 +204,48 @@ class Answer(models.Model):
     question = models.ForeignKey(
         Question,
         on_delete=models.CASCADE,
-        related_name='answers'
+        related_name='answers',
+        db_index=False
     )
     is_correct = models.BooleanField(default=False, verbose_name='Правильный ответ')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['question', '-is_correct', 'created_at', 'id']),
+        ]
+
+
+class Vote(models.Model):
+    LIKE = 1
+    DISLIKE = -1
+    VALUES = (
+        (LIKE, 'Like'),
+        (DISLIKE, 'Dislike'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='votes',
+        db_index=False
+    )
+    question = models.ForeignKey(
+        Question,
+        on_delete=models.CASCADE,
+        related_name='votes',
+        db_index=False
+    )
+    value = models.SmallIntegerField(choices=VALUES)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='main_vote_user_question_uniq'),
+        ]
         indexes = [
+            models.Index(fields=['question', 'value']),
             models.Index(fields=['created_at']),
-            models.Index(fields=['question']),
         ]
@@ -0,0 +1,167 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+
+# Номерные страницы дальше этой отдаются только через курсор.
+MAX_PAGE_NUMBER = 50
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """Paginates by the values of the ordering columns instead of OFFSET.
+
+    ``ordering`` must end with a unique column (normally ``-id``) so every row
+    has a distinct position. The cursor is an opaque token holding the key of
+    the first or last row of the page and the direction to move in.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+
+    def get_page(self, cursor=None):
+        position = self.decode_cursor(cursor)
+        if position is None:
+            return self.first_page()
+
+        direction, key = position
+        if direction == 'next':
+            rows = list(
+                self.queryset.filter(self.after(key)).order_by(*self.ordering)[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return KeysetPage(
+                rows,
+                next_cursor=self.encode_cursor('next', rows[-1]) if has_more else None,
+                previous_cursor=self.encode_cursor('prev', rows[0]) if rows else None,
+            )
+
+        reverse = [self.reverse(name) for name in self.ordering]
+        rows = list(
+            self.queryset.filter(self.after(key, reverse=True)).order_by(*reverse)[:self.per_page + 1]
+        )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not has_more:
+            return self.first_page()
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor('next', rows[-1]) if rows else None,
+            previous_cursor=self.encode_cursor('prev', rows[0]),
+        )
+
+    def first_page(self):
+        rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor('next', rows[-1]) if has_more else None,
+        )
+
+    def after(self, key, reverse=False):
+        # (a, b, c) > (x, y, z) раскрывается в
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, key):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        # Отдельное условие по первой колонке дает базе границу для range scan.
+        name, descending = self.fields[0]
+        bound = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{name}__{bound}': key[0]}) & condition
+
+    def encode_cursor(self, direction, row):
+        key = []
+        for name, _ in self.fields:
+            value = getattr(row, name)
+            key.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        payload = json.dumps([direction, key], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).rstrip(b'=').decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, raw_key = json.loads(payload)
+            if direction not in ('next', 'prev') or len(raw_key) != len(self.fields):
+                return None
+            model = self.queryset.model
+            key = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, raw_key)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            return None
+        return direction, key
+
+    @staticmethod
+    def reverse(name):
+        return name[1:] if name.startswith('-') else f'-{name}'
+
+
+class FeedPaginator(Paginator):
+    @property
+    def page_range(self):
+        return range(1, min(self.num_pages, MAX_PAGE_NUMBER) + 1)
+
+
+def paginate_feed(request, queryset, ordering, per_page):
+    """Returns a page for ``?cursor=`` or a shallow ``?page=N`` request.
+
+    Page numbers keep working up to MAX_PAGE_NUMBER through the regular
+    Paginator; everything else is served by keyset pagination, which never
+    runs COUNT(*) or a deep OFFSET.
+    """
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        try:
+            page_number = int(page_number)
+        except ValueError:
+            page_number = 1
+        if page_number > MAX_PAGE_NUMBER:
+            raise Http404('Use cursor pagination for deep pages')
+        paginator = FeedPaginator(queryset.order_by(*ordering), per_page)
+        page = paginator.get_page(page_number)
+        # С последней номерной страницы дальше ведет курсор.
+        page.next_cursor = None
+        if page.number == MAX_PAGE_NUMBER and page.has_next():
+            page.next_cursor = KeysetPaginator(queryset, ordering, per_page).encode_cursor('next', page[-1])
+        return page
+
+    paginator = KeysetPaginator(queryset, ordering, per_page)
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,289 @@
+import contextvars
+import heapq
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES_KEPT = 5
+SQL_PREVIEW_LENGTH = 300
+
+_current = contextvars.ContextVar('perf_request', default=None)
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'PERF_ENABLED', True)
+
+
+class RequestStats:
+    """Numbers collected while one request is being handled."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.slowest = []
+        # Async-представления выполняют запросы одного HTTP-запроса в
+        # нескольких потоках сразу.
+        self.lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        with self.lock:
+            self.queries += 1
+            self.sql_time += duration
+            keep_slowest(self.slowest, duration, sql)
+
+
+class RouteStats:
+    """Running totals for one URL name since the process started."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.max_total_time = 0.0
+        self.slowest = []
+
+    def add(self, stats, total_time):
+        self.requests += 1
+        self.queries += stats.queries
+        self.max_queries = max(self.max_queries, stats.queries)
+        self.sql_time += stats.sql_time
+        self.template_time += stats.template_time
+        self.total_time += total_time
+        self.max_total_time = max(self.max_total_time, total_time)
+        for duration, sql in stats.slowest:
+            keep_slowest(self.slowest, duration, sql)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'avg_sql_ms': ms(self.sql_time / self.requests),
+            'avg_template_ms': ms(self.template_time / self.requests),
+            'avg_total_ms': ms(self.total_time / self.requests),
+            'max_total_ms': ms(self.max_total_time),
+            'slowest_queries': slowest_as_list(self.slowest),
+        }
+
+
+def keep_slowest(heap, duration, sql):
+    # Мин-куча фиксированного размера: в ней остаются самые медленные запросы.
+    item = (duration, sql[:SQL_PREVIEW_LENGTH])
+    if len(heap) < SLOW_QUERIES_KEPT:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def slowest_as_list(heap):
+    return [
+        {'ms': ms(duration), 'sql': sql}
+        for duration, sql in sorted(heap, reverse=True)
+    ]
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def record_query(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook that times every query."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Обертка ставится на каждое соединение, в каком бы потоке оно ни было
+    # открыто; запрос попадает в статистику, если поток выполняет HTTP-запрос
+    # (контекст копируется в потоки sync_to_async).
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.view_name:
+        return '<unresolved>'
+    return match.view_name
+
+
+def summary():
+    with _routes_lock:
+        return {name: route.as_dict() for name, route in sorted(_routes.items())}
+
+
+def reset():
+    with _routes_lock:
+        _routes.clear()
+
+
+class PerfMiddleware:
+    """Collects query count, SQL time and template time per URL name.
+
+    Queries are counted on every connection used for the request, including
+    the worker threads of async views. Every request is logged to the
+    ``main.perf`` logger: at DEBUG level
+    normally and at WARNING when it took longer than PERF_SLOW_REQUEST_MS.
+    With DEBUG on the numbers are also returned as ``X-Perf-*`` headers.
+    Template time is measured by PerfTemplates, so it only appears when that
+    backend is configured in TEMPLATES.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not enabled():
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not enabled():
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    def finish(self, request, response, stats, total_time):
+        name = route_name(request)
+        if name == 'perf_summary':
+            return response
+
+        with _routes_lock:
+            _routes.setdefault(name, RouteStats()).add(stats, total_time)
+
+        self.log(request, response, name, stats, total_time)
+        if settings.DEBUG:
+            response['X-Perf-Queries'] = str(stats.queries)
+            response['X-Perf-SQL-Ms'] = str(ms(stats.sql_time))
+            response['X-Perf-Template-Ms'] = str(ms(stats.template_time))
+            response['X-Perf-Total-Ms'] = str(ms(total_time))
+        return response
+
+    def log(self, request, response, name, stats, total_time):
+        slow = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        level = logging.WARNING if ms(total_time) >= slow else logging.DEBUG
+        # Запись и JSON собираем, только если лог ее примет.
+        if not logger.isEnabledFor(level):
+            return
+        entry = {
+            'route': name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'sql_ms': ms(stats.sql_time),
+            'template_ms': ms(stats.template_time),
+            'total_ms': ms(total_time),
+            'slowest_queries': slowest_as_list(stats.slowest),
+        }
+        logger.log(level, 'perf %s', json.dumps(entry), extra={'perf': entry})
+
+
+class PerfTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+
+        # Вложенный render_to_string уже входит во время внешнего шаблона.
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                stats.template_time += time.perf_counter() - start
+
+
+class PerfTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report their render time."""
+
+    def get_template(self, template_name):
+        return PerfTemplate(super().get_template(template_name).template, self)
+
+    def from_string(self, template_code):
+        return PerfTemplate(super().from_string(template_code).template, self)
+
+
+def database_stats():
+    """Connection settings of every database and the pool counters, if pooled.
+
+    The counters come from psycopg_pool and are totals since the process
+    started; the wait time is how long requests waited for a free connection.
+    """
+    result = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, 'pool', None)
+        entry = {
+            'vendor': connection.vendor,
+            'pooled': pool is not None,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+        }
+        if pool is not None:
+            stats = pool.get_stats()
+            requests = stats.get('requests_num', 0)
+            queued = stats.get('requests_queued', 0)
+            wait_ms = stats.get('requests_wait_ms', 0)
+            entry.update({
+                'pool': stats,
+                'avg_wait_ms': round(wait_ms / requests, 2) if requests else 0,
+                'avg_queued_wait_ms': round(wait_ms / queued, 2) if queued else 0,
+            })
+        result[alias] = entry
+    return result
+
+
+def summary_view(request):
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404
+    return JsonResponse({'routes': summary(), 'databases': database_stats()})
@@ -0,0 +1,54 @@
+from django.db.models import F, FloatField, Func
+from django.utils import timezone
+
+# Счет "горячести" линеен по голосам, ответам и времени создания: один
+# чистый голос поднимает вопрос на VOTE_WEIGHT * SECONDS_PER_POINT секунд
+# "свежести". Более новые вопросы стартуют выше, поэтому старые со временем
+# уходят вниз без пересчета, а голос или ответ меняют счет на константу —
+# это можно сделать одним UPDATE ... SET hot_score = hot_score + delta.
+VOTE_WEIGHT = 1.0
+ANSWER_WEIGHT = 2.0
+SECONDS_PER_POINT = 3600
+
+
+class Epoch(Func):
+    """Whole seconds since 1970-01-01 UTC of a datetime column."""
+
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='FLOOR(EXTRACT(EPOCH FROM %(expressions)s))', **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS REAL)", **extra_context
+        )
+
+
+def vote_delta(likes_delta, dislikes_delta):
+    return (likes_delta - dislikes_delta) * VOTE_WEIGHT
+
+
+def hot_score(likes_count, dislikes_count, answers_count, created_at=None):
+    created_at = created_at or timezone.now()
+    return (
+        vote_delta(likes_count, dislikes_count)
+        + answers_count * ANSWER_WEIGHT
+        + int(created_at.timestamp()) / SECONDS_PER_POINT
+    )
+
+
+def hot_score_expression(likes_count=F('likes_count'), dislikes_count=F('dislikes_count'),
+                         answers_count=F('answers_count')):
+    """The same formula as ``hot_score`` computed by the database.
+
+    The counters can be replaced by other expressions, e.g. the values
+    reconcile_counters is about to write.
+    """
+    return (
+        (likes_count - dislikes_count) * VOTE_WEIGHT
+        + answers_count * ANSWER_WEIGHT
+        + Epoch('created_at') / SECONDS_PER_POINT
+    )
@@ -0,0 +1,187 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# Должно совпадать с конфигурацией в миграции 0012_question_search.
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'main_question_fts'
+FALLBACK_CANDIDATES = 500
+
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+
+# Триггеры, которые держат FTS5-таблицу в синхронизации с main_question
+# (как в миграции 0012_question_search).
+SQLITE_TRIGGERS = {
+    'main_question_fts_ai': (
+        "CREATE TRIGGER main_question_fts_ai AFTER INSERT ON main_question BEGIN "
+        "INSERT INTO main_question_fts(rowid, title, text) VALUES (new.id, new.title, new.text); "
+        "END"
+    ),
+    'main_question_fts_ad': (
+        "CREATE TRIGGER main_question_fts_ad AFTER DELETE ON main_question BEGIN "
+        "INSERT INTO main_question_fts(main_question_fts, rowid, title, text) "
+        "VALUES ('delete', old.id, old.title, old.text); "
+        "END"
+    ),
+    'main_question_fts_au': (
+        "CREATE TRIGGER main_question_fts_au AFTER UPDATE OF title, text ON main_question BEGIN "
+        "INSERT INTO main_question_fts(main_question_fts, rowid, title, text) "
+        "VALUES ('delete', old.id, old.title, old.text); "
+        "INSERT INTO main_question_fts(rowid, title, text) VALUES (new.id, new.title, new.text); "
+        "END"
+    ),
+}
+
+_fts_available = None
+
+
+class SearchHit:
+    __slots__ = ('id', 'rank', 'title', 'snippet')
+
+    def __init__(self, id, rank, title, snippet):
+        self.id = id
+        self.rank = rank
+        self.title = title
+        self.snippet = snippet
+
+
+def search(model, query, limit, offset=0):
+    """Return ranked SearchHit rows for ``query``, best match first.
+
+    PostgreSQL uses the generated ``search_vector`` column and its GIN index,
+    SQLite the FTS5 table kept in sync by triggers. Other databases (or SQLite
+    without FTS5) fall back to a scan of at most FALLBACK_CANDIDATES rows
+    ranked in Python.
+    """
+    terms = re.findall(r'\w+', query.lower())
+    if not terms:
+        return []
+
+    if connection.vendor == 'postgresql':
+        return search_postgresql(model, query, limit, offset)
+    if connection.vendor == 'sqlite' and sqlite_fts_available():
+        return search_sqlite(terms, limit, offset)
+    return search_fallback(model, terms, limit, offset)
+
+
+def sqlite_fts_available():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def restore_sqlite_triggers(connection):
+    """Recreate the FTS triggers that a rebuild of main_question dropped.
+
+    SQLite adds a NOT NULL column by copying the table, and the copy has no
+    triggers. Runs after every ``migrate``; returns the names recreated.
+    """
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'main_question'")
+        existing = {name for name, in cursor.fetchall()}
+        missing = [name for name in SQLITE_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(SQLITE_TRIGGERS[name])
+        if missing:
+            # Вопросы, измененные без триггеров, попадут в индекс заново.
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return missing
+
+
+def search_postgresql(model, query, limit, offset):
+    table = model._meta.db_table
+    options = f'StartSel="{START_SEL}", StopSel="{STOP_SEL}"'
+    # ts_headline дорогая, поэтому считается только для строк текущей страницы.
+    sql = (
+        f'SELECT q.id, hit.rank, '
+        f"ts_headline(%s, q.title, hit.query, %s), "
+        f"ts_headline(%s, q.text, hit.query, %s) "
+        f'FROM ('
+        f'  SELECT id, query, ts_rank_cd(search_vector, query) AS rank '
+        f'  FROM {table}, websearch_to_tsquery(%s, %s) query '
+        f'  WHERE search_vector @@ query '
+        f'  ORDER BY rank DESC, id DESC '
+        f'  LIMIT %s OFFSET %s'
+        f') hit JOIN {table} q ON q.id = hit.id '
+        f'ORDER BY hit.rank DESC, q.id DESC'
+    )
+    params = [
+        SEARCH_CONFIG, options + ', HighlightAll=true',
+        SEARCH_CONFIG, options + ', MaxFragments=2, MaxWords=30, MinWords=10',
+        SEARCH_CONFIG, query, limit, offset,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            SearchHit(id, rank, render_highlight(title), render_highlight(snippet))
+            for id, rank, title, snippet in cursor.fetchall()
+        ]
+
+
+def search_sqlite(terms, limit, offset):
+    # Каждое слово в кавычках, чтобы пользовательский ввод не разбирался как
+    # синтаксис FTS5.
+    match = ' '.join(f'"{term}"' for term in terms)
+    sql = (
+        f'SELECT rowid, bm25({FTS_TABLE}, 10.0, 1.0) AS rank, '
+        f'highlight({FTS_TABLE}, 0, char(2), char(3)), '
+        f"snippet({FTS_TABLE}, 1, char(2), char(3), '…', 32) "
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+        f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit, offset])
+        return [
+            SearchHit(id, -rank, render_highlight(title), render_highlight(snippet))
+            for id, rank, title, snippet in cursor.fetchall()
+        ]
+
+
+def search_fallback(model, terms, limit, offset):
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(text__icontains=term)
+    rows = model.objects.filter(condition) \
+        .order_by('-id') \
+        .values_list('id', 'title', 'text')[:FALLBACK_CANDIDATES]
+
+    hits = []
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    for id, title, text in rows:
+        rank = 10 * len(pattern.findall(title)) + len(pattern.findall(text))
+        hits.append(SearchHit(
+            id,
+            rank,
+            highlight_python(title, pattern),
+            highlight_python(text_fragment(text, pattern), pattern),
+        ))
+    hits.sort(key=lambda hit: (-hit.rank, -hit.id))
+    return hits[offset:offset + limit]
+
+
+def text_fragment(text, pattern, width=200):
+    match = pattern.search(text)
+    start = max(match.start() - width // 4, 0) if match else 0
+    fragment = text[start:start + width]
+    if start > 0:
+        fragment = '…' + fragment
+    if start + width < len(text):
+        fragment += '…'
+    return fragment
+
+
+def highlight_python(text, pattern):
+    return render_highlight(pattern.sub(lambda m: f'{START_SEL}{m.group(0)}{STOP_SEL}', text))
+
+
+def render_highlight(text):
+    # Экранируем весь текст и только потом превращаем маркеры в <mark>.
+    html = escape(text or '')
+    return mark_safe(html.replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
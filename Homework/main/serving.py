@@ -0,0 +1,214 @@
+"""Static and media files served by the application itself.
+
+Static files come from STATIC_ROOT as built by ``collectstatic`` with
+``main.staticfiles``: a hashed name never changes, so it is cached for a
+year, and the precompressed ``.br``/``.gz`` copy is picked by the
+Accept-Encoding of the request. Media files support Range requests and can
+be handed over to the front server with X-Sendfile or X-Accel-Redirect
+(MEDIA_SENDFILE).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles import views as staticfiles_views
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from . import avatars
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# В порядке предпочтения сервера.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+_hashed_names = None
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def resolve(root, path):
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+    return full_path
+
+
+def content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def accepted_encodings(request):
+    """Codings of Accept-Encoding that the client did not refuse with q=0."""
+    accepted = set()
+    refused = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            (accepted if quality > 0 else refused).add(coding)
+    if '*' in accepted:
+        accepted.update(coding for coding, _ in ENCODINGS if coding not in refused)
+    return accepted
+
+
+def hashed_names():
+    # Имена из манифеста collectstatic: их содержимое никогда не меняется.
+    global _hashed_names
+    if _hashed_names is None:
+        _hashed_names = frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    return _hashed_names
+
+
+def not_modified(request, stat):
+    return not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+
+
+@require_safe
+def static_file(request, path):
+    if settings.DEBUG:
+        # Без collectstatic: файлы берутся из каталогов приложений.
+        return staticfiles_views.serve(request, path, insecure=True)
+
+    full_path = resolve(settings.STATIC_ROOT, path)
+    encoding = None
+    served_path = full_path
+    accepted = accepted_encodings(request)
+    for coding, suffix in ENCODINGS:
+        if coding in accepted and os.path.isfile(full_path + suffix):
+            encoding, served_path = coding, full_path + suffix
+            break
+
+    stat = os.stat(served_path)
+    if not_modified(request, stat):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(served_path, 'rb'), content_type=content_type(full_path))
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+
+    if path in hashed_names():
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE)
+    if os.path.isfile(full_path + '.gz') or os.path.isfile(full_path + '.br'):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def parse_range(header, size):
+    """``(start, end)`` of a single ``bytes=`` range, ends included.
+
+    Returns None when the header should be ignored and the whole file sent
+    (malformed or several ranges).
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-N — последние N байт.
+        length = int(end)
+        if length == 0 or size == 0:
+            raise UnsatisfiableRange
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        raise UnsatisfiableRange
+    if end < start:
+        return None
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def media_file(request, path):
+    full_path = resolve(settings.MEDIA_ROOT, path)
+    stat = os.stat(full_path)
+    last_modified = http_date(stat.st_mtime)
+
+    if not_modified(request, stat):
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_SENDFILE == 'X-Accel-Redirect':
+        # nginx сам отдает файл из internal location, включая Range.
+        response = HttpResponse(content_type=content_type(full_path))
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    elif settings.MEDIA_SENDFILE == 'X-Sendfile':
+        response = HttpResponse(content_type=content_type(full_path))
+        response['X-Sendfile'] = full_path
+    else:
+        response = ranged_response(request, full_path, stat.st_size, last_modified)
+
+    response['Last-Modified'] = last_modified
+    response['Accept-Ranges'] = 'bytes'
+    if avatars.is_content_name(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
+
+
+def ranged_response(request, full_path, size, last_modified):
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if header and (if_range is None or if_range == last_modified):
+        try:
+            byte_range = parse_range(header, size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'), content_type=content_type(full_path))
+
+    start, end = byte_range
+    if end == size - 1:
+        # Хвост файла: FileResponse считает длину от позиции и сохраняет
+        # wsgi.file_wrapper (sendfile).
+        file = open(full_path, 'rb')
+        file.seek(start)
+        response = FileResponse(file, status=206, content_type=content_type(full_path))
+    else:
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            read_range(full_path, start, length), status=206, content_type=content_type(full_path)
+        )
+        response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,141 @@
+from django.db import connections
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import ranking, search, versions
+from .models import Answer, Question, QuestionTag, Tag, User
+
+# Поля пользователя, которые попадают в закэшированные карточки вопросов.
+CARD_USER_FIELDS = {'username', 'avatar'}
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    Question.objects.filter(pk=instance.question_id, answers_count__gt=0) \
+        .update(answers_count=F('answers_count') - 1,
+                hot_score=F('hot_score') - ranking.ANSWER_WEIGHT)
+    User.objects.filter(pk=instance.author_id, answers_count__gt=0) \
+        .update(answers_count=F('answers_count') - 1)
+    versions.bump(
+        versions.question_key(instance.question_id),
+        versions.activity_key(instance.question_id),
+        versions.ACTIVITY_KEY,
+    )
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, created, **kwargs):
+    # Отметка правильного ответа тоже меняет страницу вопроса.
+    keys = [versions.activity_key(instance.question_id), versions.ACTIVITY_KEY]
+    if created:
+        # Парный answer_deleted: счетчики растут при любом создании ответа,
+        # не только через форму.
+        Question.objects.filter(pk=instance.question_id) \
+            .update(answers_count=F('answers_count') + 1,
+                    hot_score=F('hot_score') + ranking.ANSWER_WEIGHT)
+        User.objects.filter(pk=instance.author_id) \
+            .update(answers_count=F('answers_count') + 1)
+        keys.append(versions.question_key(instance.question_id))
+    versions.bump(*keys)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    versions.bump(
+        versions.question_key(instance.pk),
+        versions.activity_key(instance.pk),
+        versions.QUESTIONS_KEY,
+        versions.ACTIVITY_KEY,
+    )
+    # У нового вопроса тегов еще нет, их версии сдвинет question_tags_changed.
+    if not created:
+        bump_tags(instance.tags.all())
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is None or CARD_USER_FIELDS & set(update_fields):
+        versions.bump(versions.user_key(instance.pk), versions.USERS_KEY)
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def question_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        # Плашки тегов есть и на карточках главной ленты.
+        versions.bump(versions.QUESTIONS_KEY)
+        if reverse:
+            if pk_set:
+                versions.bump(*[versions.question_key(pk) for pk in pk_set])
+                touch_questions(pk_set)
+            versions.bump(versions.tag_key(instance.title))
+        else:
+            versions.bump(versions.question_key(instance.pk))
+            touch_questions([instance.pk])
+            if pk_set:
+                bump_tags(Tag.objects.filter(pk__in=pk_set))
+
+    if action == 'pre_clear':
+        if reverse:
+            touch_questions(instance.questions.values('pk'))
+        else:
+            bump_tags(instance.tags.all())
+
+    if action == 'pre_clear':
+        if reverse:
+            Tag.objects.filter(pk=instance.pk).update(questions_count=0)
+        else:
+            change_tag_counts(instance.tags.values('pk'), -1)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            change_tag_counts([instance.pk], delta * len(pk_set))
+        else:
+            change_tag_counts(pk_set, delta)
+
+    if action == 'post_add' and pk_set:
+        # tags.add() вне AskForm создает строки со значениями по умолчанию.
+        if reverse:
+            copy_question_columns(QuestionTag.objects.filter(tag=instance.pk, question__in=pk_set))
+        else:
+            copy_question_columns(QuestionTag.objects.filter(question=instance.pk, tag__in=pk_set))
+
+
+@receiver(pre_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    # Строки main_question_tags удаляются каскадом без m2m_changed.
+    change_tag_counts(instance.tags.values('pk'), -1)
+    bump_tags(instance.tags.all())
+    versions.bump(versions.QUESTIONS_KEY)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'main':
+        search.restore_sqlite_triggers(connections[using])
+
+
+def bump_tags(tags):
+    titles = tags.values_list('title', flat=True)
+    versions.bump(*[versions.tag_key(title) for title in titles])
+
+
+def touch_questions(question_ids):
+    # Теги входят в ответы API, а их ETag строится по updated_at.
+    Question.objects.filter(pk__in=question_ids).update(updated_at=timezone.now())
+
+
+def copy_question_columns(postings):
+    question = Question.objects.filter(pk=OuterRef('question_id'))
+    postings.update(
+        created_at=Subquery(question.values('created_at')),
+        likes_count=Subquery(question.values('likes_count')),
+    )
+
+
+def change_tag_counts(tag_ids, delta):
+    tags = Tag.objects.filter(pk__in=tag_ids)
+    if delta < 0:
+        tags = tags.filter(questions_count__gte=-delta)
+    tags.update(questions_count=F('questions_count') + delta)
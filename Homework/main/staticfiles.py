@@ -0,0 +1,53 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico')
+MIN_SIZE = 256
+# Сжатая копия, которая почти не меньше оригинала, не нужна.
+MIN_RATIO = 0.95
+
+
+def compressed_variants(content):
+    yield '.gz', gzip.compress(content, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress(content, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes ``.gz`` (and ``.br``) variants.
+
+    ``collectstatic`` names every file by its content hash, as the parent
+    class does, and then compresses the hashed text files once, so that
+    ``main.serving`` can send them without compressing per request. Brotli
+    variants are written only when the ``brotli`` package is installed.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(COMPRESSED_EXTENSIONS):
+                for compressed_name in self.compress(name):
+                    yield compressed_name, compressed_name, True
+
+    def compress(self, name):
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < MIN_SIZE:
+            return
+        for suffix, data in compressed_variants(content):
+            if len(data) > len(content) * MIN_RATIO:
+                continue
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(data))
+            yield compressed_name
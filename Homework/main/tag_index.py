@@ -0,0 +1,130 @@
+"""In-process prefix index of tag titles for the ask form autocomplete.
+
+Titles are kept in a sorted list, so the tags starting with a prefix are
+one ``bisect`` range. Every process holds its own copy: tags created here
+are inserted right away, tags created by other processes are picked up by
+id when ``versions.TAG_INDEX_KEY`` changes. The question counts used for
+ranking only change on a full rebuild, every REBUILD_INTERVAL seconds.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+from . import versions
+from .models import Tag
+
+REBUILD_INTERVAL = 300
+SUGGEST_LIMIT = 10
+# Для коротких префиксов диапазон большой: дешевле пройти теги по
+# популярности и взять первые подходящие.
+SCAN_POPULAR_ABOVE = 2000
+
+
+class TagIndex:
+    def __init__(self, rows, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.max_id = 0
+        self.keys = []      # заголовки в нижнем регистре, по возрастанию
+        self.titles = []
+        self.counts = []
+        for tag_id, title, questions_count in sorted(rows, key=lambda row: row[1].lower()):
+            self.keys.append(title.lower())
+            self.titles.append(title)
+            self.counts.append(questions_count)
+            self.max_id = max(self.max_id, tag_id)
+        self.popular = sorted(zip(self.counts, self.keys, self.titles), key=lambda item: (-item[0], item[1]))
+        self.lock = threading.Lock()
+
+    def insert(self, title, questions_count=0):
+        """Add a tag unless it is already there; return True if added."""
+        key = title.lower()
+        with self.lock:
+            position = bisect.bisect_left(self.keys, key)
+            while position < len(self.keys) and self.keys[position] == key:
+                if self.titles[position] == title:
+                    return False
+                position += 1
+            self.keys.insert(position, key)
+            self.titles.insert(position, title)
+            self.counts.insert(position, questions_count)
+            # Новые теги почти без вопросов, место им в конце.
+            self.popular.append((questions_count, key, title))
+            return True
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT):
+        key = prefix.lower()
+        with self.lock:
+            start = bisect.bisect_left(self.keys, key)
+            end = bisect.bisect_left(self.keys, key + '\U0010ffff', start)
+            if end - start > SCAN_POPULAR_ABOVE:
+                found = []
+                for questions_count, tag_key, title in self.popular:
+                    if tag_key.startswith(key):
+                        found.append((title, questions_count))
+                        if len(found) == limit:
+                            break
+                return found
+            best = heapq.nsmallest(limit, range(start, end), key=lambda i: (-self.counts[i], self.keys[i]))
+            return [(self.titles[i], self.counts[i]) for i in best]
+
+    def catch_up(self, version):
+        """Insert the tags created by other processes since the last look."""
+        rows = Tag.objects.filter(pk__gt=self.max_id).values_list('id', 'title', 'questions_count')
+        # max_id двигается только здесь: теги, вставленные из этого процесса,
+        # могут быть новее чужих, которые мы еще не видели.
+        for tag_id, title, questions_count in rows:
+            self.insert(title, questions_count)
+            self.max_id = max(self.max_id, tag_id)
+        self.version = version
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build(version):
+    rows = Tag.objects.values_list('id', 'title', 'questions_count')
+    return TagIndex(rows, version)
+
+
+def get_index():
+    global _index
+    version = versions.get_many([versions.TAG_INDEX_KEY])[versions.TAG_INDEX_KEY]
+    with _index_lock:
+        if _index is None or time.monotonic() - _index.built_at > REBUILD_INTERVAL:
+            _index = build(version)
+        elif _index.version != version:
+            _index.catch_up(version)
+        return _index
+
+
+def suggest(prefix, limit=SUGGEST_LIMIT):
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    return get_index().suggest(prefix, limit)
+
+
+def add_tags(tags):
+    """Put tags just saved by this process into the index.
+
+    If any of them was new here, the version is bumped so the other
+    processes fetch it too.
+    """
+    index = _index
+    if index is None:
+        added = True
+    else:
+        added = False
+        for tag in tags:
+            added = index.insert(tag.title, tag.questions_count) or added
+    if added:
+        versions.bump(versions.TAG_INDEX_KEY)
+
+
+def reset():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,25 @@
+from django import template
+from django.templatetags.static import static
+
+from main.avatars import variant_url
+
+register = template.Library()
+
+
+@register.inclusion_tag('main/includes/avatar.html')
+def avatar(user, size, css_class='rounded', style=''):
+    """``<picture>`` with the WebP and JPEG variants of a user's avatar.
+
+    ``size`` is the displayed size in pixels; the 2x variant goes to srcset.
+    """
+    context = {'size': size, 'css_class': css_class, 'style': style, 'alt': user.username}
+    if not user.avatar:
+        context['src'] = static('img/avatar.jpg')
+    elif not user.avatar_thumbnails:
+        context['src'] = user.avatar.url
+    else:
+        context['src'] = variant_url(user, size, 'jpg')
+        context['src_2x'] = variant_url(user, size * 2, 'jpg')
+        context['webp'] = variant_url(user, size, 'webp')
+        context['webp_2x'] = variant_url(user, size * 2, 'webp')
+    return context
@@ -1,3 +1,1170 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from . import (
+    async_views, avatars, conditional, fragments, perf, ranking, search, serving, tag_index, urls, versions,
+    views, vote_buffer,
+)
+from .management.commands import fill_db
+from .models import PREVIEW_LENGTH, Answer, Question, QuestionTag, Tag, User, Vote
+from .staticfiles import CompressedManifestStaticFilesStorage
+
+# Бюджеты запросов к базе на один запрос к странице при холодном кэше
+# (база заполнена fill_db).
+# Рост числа запросов с размером страницы (N+1) сразу выходит за бюджет.
+QUERY_BUDGETS = {
+    # ленты и страницы вопроса
+    'index': 4,
+    'index_page': 5,
+    'index_cursor': 4,
+    'hot_questions': 4,
+    'tag': 5,
+    'question': 5,
+    'question_answers': 3,
+    'search': 5,
+    'tags_suggest': 1,
+    'api_feed': 2,
+    'api_tag': 3,
+    'api_question': 3,
+    'api_answers': 2,
+    'api_not_modified': 2,
+    'auth_index': 7,
+    'auth_question': 7,
+    # формы
+    'login': 2,
+    'signup': 2,
+    'ask': 4,
+    'settings': 4,
+    'login_required': 0,
+    # запись
+    'ask_post': 9,
+    'answer_post': 8,
+    'settings_post': 3,
+    'toggle_like': 9,
+    'toggle_dislike': 9,
+    'mark_correct': 7,
+    'login_post': 9,
+    'signup_post': 14,
+    'logout': 4,
+}
+
+FILL_RATIO = 20
+FILL_SEED = 1
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    CACHE_BACKGROUND_REFRESH=False,
+    VOTE_BUFFER_ENABLED=False,
+)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('fill_db', FILL_RATIO, seed=FILL_SEED, stdout=StringIO())
+        cls.user = User.objects.order_by('id').first()
+        cls.question = Question.objects.filter(answers_count__gt=0).order_by('id').first()
+        cls.tag = Tag.objects.order_by('-questions_count').first()
+
+    def assertWithinBudget(self, budget, method, url, **kwargs):
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLessEqual(
+            len(queries), QUERY_BUDGETS[budget],
+            f'{budget}: {len(queries)} queries\n' +
+            '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+        return response
+
+    def login(self):
+        self.client.force_login(self.user)
+
+    def test_feeds(self):
+        response = self.assertWithinBudget('index', 'get', reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        cursor = response.context['questions'].next_cursor
+        self.assertIsNotNone(cursor)
+
+        self.assertWithinBudget('index_page', 'get', reverse('index'), data={'page': 2})
+        self.assertWithinBudget('index_cursor', 'get', reverse('index'), data={'cursor': cursor})
+        self.assertWithinBudget('hot_questions', 'get', reverse('hot_questions'))
+        response = self.assertWithinBudget('tag', 'get', reverse('tag', args=[self.tag.title]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_numbered_page(self):
+        with mock.patch('main.pagination.MAX_PAGE_NUMBER', 2):
+            response = self.client.get(reverse('index'), {'page': 2})
+        page = response.context['questions']
+        self.assertIsNotNone(page.next_cursor)
+        self.assertNotContains(response, 'page=3')
+        self.assertContains(response, f'cursor={page.next_cursor}')
+        response = self.client.get(reverse('index'), {'cursor': page.next_cursor})
+        self.assertEqual(response.context['questions'][0].id, Question.objects.order_by('-created_at', '-id')[40].id)
+
+    def test_tags_suggest(self):
+        tag_index.reset()
+        response = self.assertWithinBudget('tags_suggest', 'get', reverse('tags_suggest'),
+                                           data={'q': self.tag.title[:2]})
+        self.assertIn(self.tag.title, [tag['title'] for tag in response.json()['tags']])
+
+    def test_question(self):
+        response = self.assertWithinBudget('question', 'get', reverse('question', args=[self.question.id]))
+        self.assertEqual(response.status_code, 200)
+        response = self.assertWithinBudget(
+            'question_answers', 'get', reverse('question_answers', args=[self.question.id])
+        )
+        self.assertIn('html', response.json())
+
+    def test_api(self):
+        for name, args in (('api_new_questions', []), ('api_hot_questions', [])):
+            response = self.assertWithinBudget('api_feed', 'get', reverse(name, args=args))
+            self.assertEqual(len(response.json()['results']), 20)
+        self.assertWithinBudget('api_tag', 'get', reverse('api_tag_questions', args=[self.tag.title]))
+        response = self.assertWithinBudget('api_question', 'get', reverse('api_question', args=[self.question.id]))
+        data = response.json()
+        self.assertEqual(data['answers_count'], len(data['answers']['results']))
+        self.assertWithinBudget('api_answers', 'get', reverse('api_question_answers', args=[self.question.id]))
+
+    def test_api_etags(self):
+        url = reverse('api_new_questions')
+        response = self.client.get(url, {'limit': 5})
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, {'limit': 5})['ETag'], etag)
+
+        response = self.assertWithinBudget('api_not_modified', 'get', url, data={'limit': 5},
+                                           HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # Голос меняет счетчики, а с ними и ETag.
+        question_id = self.client.get(url, {'limit': 5}).json()['results'][0]['id']
+        self.login()
+        self.client.post(reverse('toggle_like'), {'id': question_id})
+        self.assertEqual(self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Теги и имя автора тоже входят в ответ.
+        question = Question.objects.get(pk=question_id)
+        for change in (lambda: question.tags.remove(question.tags.first()),
+                       lambda: User.objects.filter(pk=question.author_id).update(username='renamed')):
+            etag = self.client.get(url, {'limit': 5})['ETag']
+            change()
+            self.assertEqual(self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        cursor = self.client.get(url, {'limit': 5}).json()['next']
+        page = self.client.get(url, {'limit': 5, 'cursor': cursor}).json()
+        self.assertNotIn(question_id, [item['id'] for item in page['results']])
+
+    def test_search(self):
+        # Наличие FTS-таблицы проверяется один раз на процесс.
+        search.sqlite_fts_available()
+        response = self.assertWithinBudget('search', 'get', reverse('search'), data={'q': 'question'})
+        self.assertEqual(response.status_code, 200)
+        # Заголовки fill_db — "Question N": находится полная страница.
+        self.assertEqual(len(response.context['questions']), 20)
+
+        match = Question.objects.create(title='Unicorn care', text='Feeding unicorns', author=self.user)
+        Question.objects.create(title='Horse care', text='Feeding horses', author=self.user)
+        response = self.client.get(reverse('search'), {'q': 'unicorns'})
+        self.assertEqual([question.id for question in response.context['questions']], [match.id])
+
+    def test_anonymous_pages(self):
+        for name in ('login', 'signup'):
+            response = self.assertWithinBudget(name, 'get', reverse(name))
+            self.assertEqual(response.status_code, 200)
+        for name in ('ask', 'settings'):
+            response = self.assertWithinBudget('login_required', 'get', reverse(name))
+            self.assertEqual(response.status_code, 302)
+
+    def test_authenticated_pages(self):
+        self.login()
+        self.assertWithinBudget('auth_index', 'get', reverse('index'))
+        self.assertWithinBudget('auth_question', 'get', reverse('question', args=[self.question.id]))
+        for name in ('ask', 'settings'):
+            response = self.assertWithinBudget(name, 'get', reverse(name))
+            self.assertEqual(response.status_code, 200)
+
+    def test_ask_and_answer(self):
+        self.login()
+        response = self.assertWithinBudget('ask_post', 'post', reverse('ask'), data={
+            'title': 'Budget question',
+            'text': 'Some text',
+            'tags': f'{self.tag.title}, brand_new_tag',
+        })
+        self.assertEqual(response.status_code, 302)
+
+        question = Question.objects.get(title='Budget question')
+        response = self.assertWithinBudget(
+            'answer_post', 'post', reverse('answer', args=[question.id]), data={'text': 'An answer'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Question.objects.get(pk=question.pk).answers_count, 1)
+
+    def test_settings_post(self):
+        self.login()
+        response = self.assertWithinBudget('settings_post', 'post', reverse('settings'), data={
+            'email': 'budget@example.com',
+            'nickname': 'budget',
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_votes(self):
+        self.login()
+        for name in ('toggle_like', 'toggle_dislike'):
+            response = self.assertWithinBudget(name, 'post', reverse(name), data={'id': self.question.id})
+            self.assertEqual(response.status_code, 200)
+
+    def test_mark_correct(self):
+        self.client.force_login(self.question.author)
+        answer = Answer.objects.filter(question=self.question).first()
+        response = self.assertWithinBudget(
+            'mark_correct', 'post', reverse('mark_correct'),
+            data=json.dumps({'question_id': self.question.id, 'answer_id': answer.id}),
+            content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'])
+
+    def test_auth_flow(self):
+        response = self.assertWithinBudget('login_post', 'post', reverse('login'), data={
+            'username': self.user.username,
+            'password': 'password123',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinBudget('logout', 'get', reverse('logout'))
+
+        response = self.assertWithinBudget('signup_post', 'post', reverse('signup'), data={
+            'username': 'budget_user',
+            'email': 'budget_user@example.com',
+            'nickname': 'budget',
+            'password1': 'Un1que-passw0rd',
+            'password2': 'Un1que-passw0rd',
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        # Страница из 20 карточек и из 10 (ленты тега) стоят одинаково.
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as index_queries:
+            self.client.get(reverse('index'))
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as tag_queries:
+            self.client.get(reverse('tag', args=[self.tag.title]))
+        self.assertLessEqual(abs(len(index_queries) - len(tag_queries)), 1)
+
+
+@override_settings(CACHE_BACKGROUND_REFRESH=False, VOTE_BUFFER_ENABLED=False)
+class FillDbTests(TestCase):
+    def fill(self, ratio, **options):
+        call_command('fill_db', ratio, seed=FILL_SEED, stdout=StringIO(), **options)
+
+    def counts(self):
+        return {model.__name__: model.objects.count() for model in (User, Tag, Question, QuestionTag, Answer, Vote)}
+
+    def test_row_counts_match_ratio(self):
+        self.fill(25)
+        self.assertEqual(self.counts(), {
+            'User': 25, 'Tag': 25, 'Question': 250, 'QuestionTag': 250 * 5, 'Answer': 2500, 'Vote': 25 * 200,
+        })
+        self.assertEqual(Question.objects.filter(likes_count=0, dislikes_count=0).count(), 0)
+
+    def test_small_and_empty_plans(self):
+        self.fill(0)
+        self.assertEqual(set(self.counts().values()), {0})
+        # Пар (пользователь, вопрос) меньше, чем ratio * 200.
+        self.fill(2)
+        self.assertEqual(self.counts()['Vote'], 2 * 20)
+
+
+@override_settings(CACHE_BACKGROUND_REFRESH=False, VOTE_BUFFER_ENABLED=False)
+class FillDbWorkersTests(TransactionTestCase):
+    MODELS = (User, Tag, Question, QuestionTag, Answer, Vote)
+
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        for model in self.MODELS:
+            fields = [field.attname for field in model._meta.concrete_fields]
+            for row in model.objects.order_by('pk').values_list(*fields):
+                digest.update(repr(row).encode())
+        return digest.hexdigest()
+
+    def fill(self, workers):
+        call_command('fill_db', 3, seed=FILL_SEED, workers=workers, stdout=StringIO())
+        fingerprint = self.fingerprint()
+        for model in reversed(self.MODELS):
+            model.objects.all().delete()
+        return fingerprint
+
+    def test_same_seed_same_data_for_any_workers(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Worker processes do not see an in-memory database')
+        # Мелкие блоки, чтобы процессам досталось по нескольку задач.
+        with mock.patch.dict(fill_db.BLOCK_SIZES, {kind: 7 for kind in fill_db.BLOCK_SIZES}):
+            single = self.fill(workers=1)
+            self.assertEqual(self.fill(workers=2), single)
+            self.assertEqual(self.fill(workers=1), single)
+        call_command('fill_db', 3, seed=FILL_SEED + 1, stdout=StringIO())
+        self.assertNotEqual(self.fingerprint(), single)
+
+
+@override_settings(DEBUG=True, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PerfMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        perf.reset()
+        for cache in caches.all():
+            cache.clear()
+
+    def test_headers_match_executed_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+        self.assertEqual(int(response['X-Perf-Queries']), len(queries))
+        for header in ('X-Perf-SQL-Ms', 'X-Perf-Template-Ms', 'X-Perf-Total-Ms'):
+            self.assertIn(header, response)
+
+    def test_summary(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.client.force_login(self.staff)
+        routes = self.client.get(reverse('perf_summary')).json()['routes']
+        self.assertEqual(routes['index']['requests'], 2)
+        self.assertNotIn('perf_summary', routes)
+        self.assertLessEqual(len(routes['index']['slowest_queries']), perf.SLOW_QUERIES_KEPT)
+
+    def test_summary_databases(self):
+        self.client.force_login(self.staff)
+        databases = self.client.get(reverse('perf_summary')).json()['databases']
+        default = databases['default']
+        self.assertEqual(default['vendor'], connection.vendor)
+        # Счетчики пула есть только у PostgreSQL с OPTIONS['pool'].
+        if default['pooled']:
+            self.assertIn('requests_wait_ms', default['pool'])
+            self.assertIn('avg_wait_ms', default)
+        else:
+            self.assertNotIn('pool', default)
+
+    @override_settings(DEBUG=False)
+    def test_summary_hidden_in_production(self):
+        self.assertEqual(self.client.get(reverse('perf_summary')).status_code, 404)
+        self.client.get(reverse('index'))
+        self.assertNotIn('X-Perf-Queries', self.client.get(reverse('index')))
+
+    def test_requests_are_logged(self):
+        with self.assertLogs('main.perf', level='DEBUG') as logs:
+            self.client.get(reverse('login'))
+        entry = logs.records[0].perf
+        self.assertEqual(entry['route'], 'login')
+        self.assertEqual(entry['status'], 200)
+
+    def test_disabled_log_is_not_serialized(self):
+        logger = logging.getLogger('main.perf')
+        level = logger.level
+        logger.setLevel(logging.WARNING)
+        try:
+            with mock.patch('main.perf.json.dumps') as dumps:
+                self.client.get(reverse('login'))
+        finally:
+            logger.setLevel(level)
+        dumps.assert_not_called()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+        cls.tag = Tag.objects.create(title='python')
+        cls.question = Question.objects.create(title='Cached question', text='Body', author=cls.user)
+        cls.question.tags.add(cls.tag)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def urls(self):
+        return [reverse('index'), reverse('hot_questions'), reverse('tag', args=['python']),
+                reverse('question', args=[self.question.id])]
+
+    def test_not_modified(self):
+        for url in self.urls():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith('W/"'))
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('Cookie', response['Vary'])
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_versions_change_etag(self):
+        url = reverse('question', args=[self.question.id])
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(text='New answer', author=self.user, question=self.question)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('toggle_like'), {'id': self.question.id})
+        self.client.logout()
+        for url, etag in etags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+
+    def test_question_edits_change_etag(self):
+        tag_url, index_url = reverse('tag', args=['python']), reverse('index')
+        etags = {url: self.client.get(url)['ETag'] for url in (tag_url, index_url)}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.title = 'Edited question'
+            self.question.save()
+        response = self.client.get(tag_url, HTTP_IF_NONE_MATCH=etags[tag_url])
+        self.assertContains(response, 'Edited question')
+
+        etag = self.client.get(index_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.tags.add(Tag.objects.create(title='django'))
+        response = self.client.get(index_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'django')
+
+    def test_login_changes_etag(self):
+        url = reverse('index')
+        self.client.login(username='author', password='password')
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.logout()
+        self.client.login(username='author', password='password')
+        # Старая страница несет CSRF-токен прошлой сессии.
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_authenticated_pages_are_private(self):
+        url = reverse('index')
+        anonymous_etag = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_if_modified_since(self):
+        url = reverse('tag', args=['python'])
+        old = time.time_ns() - 60 * 10 ** 9
+        versions.get_cache().set_many({key: old for key in conditional.tag_keys('python')}, None)
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class QuestionPreviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+
+    def stored_preview(self, question):
+        return Question.objects.values_list('preview', flat=True).get(pk=question.pk)
+
+    def test_preview_is_truncated(self):
+        question = Question.objects.create(title='Long', text='word\n\n  ' * 100, author=self.user)
+        preview = self.stored_preview(question)
+        self.assertEqual(len(preview), PREVIEW_LENGTH)
+        self.assertTrue(preview.startswith('word word '))
+        self.assertTrue(preview.endswith('…'))
+
+        short = Question.objects.create(title='Short', text='Short\ntext', author=self.user)
+        self.assertEqual(self.stored_preview(short), 'Short text')
+
+    def test_preview_follows_text(self):
+        question = Question.objects.create(title='Edited', text='First version', author=self.user)
+        question.text = 'Second version'
+        question.save()
+        self.assertEqual(self.stored_preview(question), 'Second version')
+
+        question.text = 'Third version'
+        question.save(update_fields=['text'])
+        self.assertEqual(self.stored_preview(question), 'Third version')
+
+
+class AnswerCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+        cls.question = Question.objects.create(title='Question', text='Body', author=cls.user)
+
+    def counters(self):
+        return (Question.objects.get(pk=self.question.pk).answers_count,
+                User.objects.get(pk=self.user.pk).answers_count)
+
+    def test_counters_follow_orm_writes(self):
+        # Ответы из админки и ORM считаются так же, как из формы.
+        first = Answer.objects.create(text='First', author=self.user, question=self.question)
+        Answer.objects.create(text='Second', author=self.user, question=self.question)
+        self.assertEqual(self.counters(), (2, 2))
+
+        first.text = 'Edited'
+        first.save()
+        self.assertEqual(self.counters(), (2, 2))
+
+        first.delete()
+        self.assertEqual(self.counters(), (1, 1))
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+
+    def found(self, query):
+        return [question.id for question in Question.objects.search(query)]
+
+    def test_index_follows_changes(self):
+        # Триггеры полнотекстового индекса должны пережить все миграции.
+        question = Question.objects.create(title='Where do unicorns live', text='Body', author=self.user)
+        self.assertEqual(self.found('unicorn'), [question.id])
+
+        question.title = 'Where do dragons live'
+        question.save()
+        self.assertEqual(self.found('unicorn'), [])
+        self.assertEqual(self.found('dragon'), [question.id])
+
+        question.delete()
+        self.assertEqual(self.found('dragon'), [])
+
+    def test_migrate_restores_triggers(self):
+        if not search.sqlite_fts_available():
+            self.skipTest('SQLite with FTS5 only')
+        # Так выглядит таблица после пересоздания миграцией на SQLite.
+        with connection.cursor() as cursor:
+            for name in search.SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        question = Question.objects.create(title='Where do unicorns live', text='Body', author=self.user)
+        self.assertEqual(self.found('unicorn'), [])
+
+        call_command('migrate', verbosity=0)
+        self.assertEqual(search.restore_sqlite_triggers(connection), [])
+        self.assertEqual(self.found('unicorn'), [question.id])
+
+
+class TagFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+        python, django, cpp = (Tag.objects.create(title=title) for title in ('python', 'django', 'c++'))
+        cls.both = Question.objects.create(title='Both', text='Body', author=cls.user)
+        cls.python_only = Question.objects.create(title='Python only', text='Body', author=cls.user)
+        cls.liked = Question.objects.create(title='Liked', text='Body', author=cls.user)
+        cls.both.tags.add(python, django, cpp, through_defaults={'created_at': cls.both.created_at})
+        cls.python_only.tags.add(python, through_defaults={'created_at': cls.python_only.created_at})
+        cls.liked.tags.add(django, python, through_defaults={'created_at': cls.liked.created_at})
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def feed(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [question.id for question in response.context['questions']]
+
+    def test_intersection(self):
+        url = reverse('tag', args=['python+django'])
+        self.assertEqual(self.feed(url), [self.liked.id, self.both.id])
+        self.assertEqual(self.feed(reverse('tag', args=['python'])),
+                         [self.liked.id, self.python_only.id, self.both.id])
+        # Тег с плюсом в названии — это один тег, а не пересечение.
+        self.assertEqual(self.feed(reverse('tag', args=['c++'])), [self.both.id])
+        self.assertEqual(self.client.get(reverse('tag', args=['python+missing'])).status_code, 404)
+
+        response = self.client.get(reverse('api_tag_questions', args=['python+django']))
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.liked.id, self.both.id])
+
+    def test_best_follows_votes(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('toggle_like'), {'id': self.both.id})
+        self.assertEqual(
+            set(QuestionTag.objects.filter(question=self.both).values_list('likes_count', flat=True)), {1}
+        )
+        self.assertEqual(self.feed(reverse('tag', args=['python+django']), sort='best'),
+                         [self.both.id, self.liked.id])
+
+    def test_postings_copy_question_columns(self):
+        Question.objects.filter(pk=self.python_only.pk).update(likes_count=2)
+        question = Question.objects.get(pk=self.python_only.pk)
+        question.tags.add(Tag.objects.get(title='django'))
+        Tag.objects.get(title='c++').questions.add(question)
+        postings = QuestionTag.objects.filter(question=question, tag__title__in=['django', 'c++'])
+        self.assertEqual(set(postings.values_list('created_at', 'likes_count')), {(question.created_at, 2)})
+
+    def test_reconcile_fixes_postings(self):
+        Question.objects.filter(pk=self.liked.pk).update(likes_count=3)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(QuestionTag.objects.get(question=self.liked, tag__title='python').likes_count, 0)
+        Vote.objects.create(user=self.user, question=self.liked, value=Vote.LIKE)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(
+            set(QuestionTag.objects.filter(question=self.liked).values_list('likes_count', flat=True)), {1}
+        )
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    VOTE_BUFFER_ENABLED=True,
+    VOTE_BUFFER_FLUSH_INTERVAL=None,
+)
+class VoteBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('voter', 'voter@example.com', 'password', nickname='voter')
+        cls.tag = Tag.objects.create(title='python')
+        cls.first = Question.objects.create(title='First', text='Body', author=cls.user)
+        cls.second = Question.objects.create(title='Second', text='Body', author=cls.user)
+        cls.first.tags.add(cls.tag)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def counters(self, question):
+        question.refresh_from_db()
+        return question.likes_count, question.dislikes_count
+
+    def test_flush_applies_journal(self):
+        hot_scores = {self.first.id: self.first.hot_score, self.second.id: self.second.hot_score}
+        vote_buffer.record(self.first.id, 1, 0)
+        vote_buffer.record(self.first.id, 1, 0)
+        vote_buffer.record(self.second.id, 0, 1)
+        vote_buffer.record(self.first.id, -1, 1)
+        self.assertEqual(self.counters(self.first), (0, 0))
+
+        self.assertEqual(vote_buffer.flush(), 4)
+        self.assertEqual(self.counters(self.first), (1, 1))
+        self.assertEqual(self.counters(self.second), (0, 1))
+        self.assertAlmostEqual(self.first.hot_score, hot_scores[self.first.id])
+        self.assertAlmostEqual(self.second.hot_score, hot_scores[self.second.id] + ranking.vote_delta(0, 1))
+        self.assertEqual(QuestionTag.objects.get(question=self.first).likes_count, 1)
+        self.assertEqual(vote_buffer.pending([self.first.id, self.second.id]),
+                         {self.first.id: (0, 0), self.second.id: (0, 0)})
+
+        # Повторный сброс ничего не применяет второй раз.
+        self.assertEqual(vote_buffer.flush(), 0)
+        self.assertEqual(self.counters(self.first), (1, 1))
+        self.assertEqual(self.counters(self.second), (0, 1))
+
+    def test_lost_entry_is_skipped_on_second_flush(self):
+        vote_buffer.record(self.first.id, 1, 0)
+        vote_buffer.record(self.first.id, 1, 0)
+        vote_buffer.record(self.second.id, 1, 0)
+        vote_buffer.get_cache().delete(vote_buffer.entry_key(2))
+
+        self.assertEqual(vote_buffer.flush(), 1)
+        self.assertEqual(self.counters(self.second), (0, 0))
+        with self.assertLogs('main.vote_buffer', level='WARNING'):
+            self.assertEqual(vote_buffer.flush(), 2)
+        self.assertEqual(self.counters(self.first), (1, 0))
+        self.assertEqual(self.counters(self.second), (1, 0))
+
+    def test_reconcile_does_not_count_buffered_votes_twice(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('toggle_like'), {'id': self.first.id})
+        call_command('reconcile_counters', stdout=StringIO())
+        vote_buffer.flush()
+        self.assertEqual(self.counters(self.first), (1, 0))
+        self.assertEqual(vote_buffer.pending([self.first.id]), {self.first.id: (0, 0)})
+
+        # Пока запись журнала не найдена, пересчет не запускается.
+        vote_buffer.record(self.first.id, 1, 0)
+        vote_buffer.get_cache().delete(vote_buffer.entry_key(vote_buffer.get_cache().get(vote_buffer.SEQ_KEY)))
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', stdout=StringIO())
+
+    def test_reads_include_pending_votes(self):
+        self.client.force_login(self.user)
+        # Запись в буфер — после коммита, поэтому счетчик в ответе на POST
+        # внутри TestCase еще старый.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('toggle_like'), {'id': self.first.id})
+        self.assertEqual(self.counters(self.first), (0, 0))
+
+        self.assertEqual(self.client.get(reverse('api_question', args=[self.first.id])).json()['likes'], 1)
+        response = self.client.get(reverse('question', args=[self.first.id]))
+        self.assertEqual(response.context['question'].likes_count, 1)
+        self.assertEqual(async_views.question_detail(self.first.id).likes_count, 1)
+        questions = vote_buffer.apply_pending(list(Question.objects.filter(pk=self.first.pk)))
+        self.assertEqual(questions[0].likes_count, 1)
+
+        vote_buffer.flush()
+        questions = vote_buffer.apply_pending(list(Question.objects.filter(pk=self.first.pk)))
+        self.assertEqual(questions[0].likes_count, 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], VOTE_BUFFER_ENABLED=False)
+class QuestionCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+        cls.viewer = User.objects.create_user('viewer', 'viewer@example.com', 'password', nickname='viewer')
+        cls.question = Question.objects.create(title='Cached title', text='Body', author=cls.author)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def index(self):
+        return self.client.get(reverse('index')).content.decode()
+
+    def test_card_follows_changes(self):
+        self.assertIn('Cached title', self.index())
+        with mock.patch('main.fragments.render_to_string', wraps=fragments.render_to_string) as render:
+            self.index()
+        render.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.title = 'Edited title'
+            self.question.save()
+        self.assertIn('Edited title', self.index())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.avatar = 'avatars/new.png'
+            self.author.save(update_fields=['username', 'avatar'])
+        html = self.index()
+        self.assertIn('Asked by: renamed', html)
+        self.assertIn('avatars/new.png', html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(text='Answer', author=self.viewer, question=self.question)
+        self.assertIn('1 answers', self.index())
+
+    def test_vote_buttons_are_per_viewer(self):
+        self.client.force_login(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('toggle_like'), {'id': self.question.id})
+        self.assertIn('like-btn active', self.index())
+
+        # Карточка уже в кэше, но чужой голос в нее не попал.
+        self.client.force_login(self.viewer)
+        with mock.patch('main.fragments.render_to_string', wraps=fragments.render_to_string) as render:
+            html = self.index()
+        render.assert_not_called()
+        self.assertNotIn('like-btn active', html)
+        self.assertIn('<span class="like-count">1</span>', html)
+
+
+class AnswerThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+        cls.question = Question.objects.create(title='Question', text='Body', author=cls.user)
+        base = timezone.now()
+        answers = [Answer.objects.create(text=f'Answer {i}', author=cls.user, question=cls.question)
+                   for i in range(views.ANSWERS_PER_PAGE + 5)]
+        # Одинаковые created_at упорядочиваются по id.
+        for i, answer in enumerate(answers):
+            Answer.objects.filter(pk=answer.pk).update(created_at=base - timedelta(minutes=i % 3))
+        Answer.objects.filter(pk=answers[20].pk).update(is_correct=True)
+        rest = Answer.objects.filter(question=cls.question, is_correct=False).order_by('created_at', 'id')
+        cls.expected = [answers[20].id, *rest.values_list('id', flat=True)]
+
+    def answer_ids(self, html):
+        return [int(answer_id) for answer_id in re.findall(r'id="answer-(\d+)"', html)]
+
+    def test_order_and_cursor_round_trip(self):
+        response = self.client.get(reverse('question', args=[self.question.id]))
+        first = response.context['answers']
+        self.assertEqual([answer.id for answer in first], self.expected[:views.ANSWERS_PER_PAGE])
+
+        data = self.client.get(reverse('question_answers', args=[self.question.id]),
+                               {'cursor': first.next_cursor}).json()
+        self.assertEqual(self.answer_ids(data['html']), self.expected[views.ANSWERS_PER_PAGE:])
+        self.assertIsNone(data['next_cursor'])
+
+        paginator = views.answers_paginator(self.question)
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual([answer.id for answer in back], self.expected[:views.ANSWERS_PER_PAGE])
+        self.assertFalse(back.has_previous())
+
+    def test_ordering_matches_thread_index(self):
+        ordering = ('question', *views.answers_paginator(self.question).ordering)
+        self.assertIn(ordering, [tuple(index.fields) for index in Answer._meta.indexes])
+
+
+class HotFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(f'voter{i}', f'voter{i}@example.com', 'password', nickname=f'voter{i}')
+            for i in range(3)
+        ]
+        now = timezone.now()
+        cls.day_old = cls.ask('Day old', now - timedelta(days=1))
+        cls.hour_old = cls.ask('Hour old', now - timedelta(hours=1))
+        cls.new = cls.ask('New', now)
+
+    @classmethod
+    def ask(cls, title, created_at):
+        question = Question.objects.create(title=title, text='Body', author=cls.users[0])
+        Question.objects.filter(pk=question.pk).update(created_at=created_at)
+        return question
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def feed(self):
+        response = self.client.get(reverse('hot_questions'))
+        return [question.id for question in response.context['questions']]
+
+    def test_newer_question_outranks_older_with_few_votes(self):
+        call_command('rescore_hot', all=True, stdout=StringIO())
+        self.assertEqual(self.feed(), [self.new.id, self.hour_old.id, self.day_old.id])
+
+        # Голоса без счетчиков: их исправит reconcile_counters вместе со счетом.
+        Vote.objects.bulk_create([Vote(user=user, question=question, value=Vote.LIKE)
+                                  for user in self.users for question in (self.hour_old, self.day_old)])
+        call_command('reconcile_counters', stdout=StringIO())
+        hour_old = Question.objects.get(pk=self.hour_old.pk)
+        self.assertEqual(hour_old.likes_count, 3)
+        self.assertAlmostEqual(hour_old.hot_score, ranking.hot_score(3, 0, 0, hour_old.created_at))
+        # Три голоса перевешивают час разницы, но не сутки.
+        self.assertEqual(self.feed(), [self.hour_old.id, self.new.id, self.day_old.id])
+
+
+class TagSuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+        Tag.objects.bulk_create([
+            Tag(title='python', questions_count=10),
+            Tag(title='PyTest', questions_count=30),
+            Tag(title='pygame', questions_count=1),
+            Tag(title='django', questions_count=50),
+        ])
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        tag_index.reset()
+
+    def suggest(self, prefix):
+        response = self.client.get(reverse('tags_suggest'), {'q': prefix})
+        self.assertEqual(response.status_code, 200)
+        return [tag['title'] for tag in response.json()['tags']]
+
+    def test_prefix_ranked_by_questions(self):
+        self.assertEqual(self.suggest('py'), ['PyTest', 'python', 'pygame'])
+        self.assertEqual(self.suggest('PYT'), ['PyTest', 'python'])
+        self.assertEqual(self.suggest('rust'), [])
+        self.assertEqual(self.suggest(''), [])
+
+    def test_large_range_scans_popular(self):
+        original = tag_index.SCAN_POPULAR_ABOVE
+        tag_index.SCAN_POPULAR_ABOVE = 1
+        try:
+            self.assertEqual(self.suggest('py'), ['PyTest', 'python', 'pygame'])
+        finally:
+            tag_index.SCAN_POPULAR_ABOVE = original
+
+    def test_new_tags_from_ask(self):
+        self.assertEqual(self.suggest('fla'), [])
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('ask'), {
+                'title': 'Flask question',
+                'text': 'Body',
+                'tags': 'flask, python, flask, ',
+            })
+        self.assertEqual(response.status_code, 302)
+        question = Question.objects.get(title='Flask question')
+        self.assertEqual(sorted(question.tags.values_list('title', flat=True)), ['flask', 'python'])
+        self.assertEqual(Tag.objects.get(title='python').questions_count, 11)
+        self.assertEqual(self.suggest('fla'), ['flask'])
+
+    def test_rolled_back_tags_stay_out(self):
+        self.assertEqual(self.suggest('fla'), [])
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('ask'), {'title': 'Flask question', 'text': 'Body', 'tags': 'flask'})
+        # Колбэки не выполнены — как при откате транзакции.
+        self.assertTrue(callbacks)
+        Tag.objects.filter(title='flask').delete()
+        self.assertEqual(self.suggest('fla'), [])
+
+    def test_tags_from_other_processes(self):
+        self.assertEqual(self.suggest('fla'), [])
+        # Другой процесс создал тег и поднял версию.
+        Tag.objects.create(title='flask')
+        versions.get_cache().delete(versions.TAG_INDEX_KEY)
+        self.assertEqual(self.suggest('fla'), ['flask'])
+
+    def test_long_tag_is_rejected(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('ask'), {'title': 'Long', 'text': 'Body', 'tags': 'x' * 51})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Question.objects.filter(title='Long').exists())
+
+
+def image_file(name, size=(300, 200), mode='RGB', color='red', image_format='PNG'):
+    buffer = BytesIO()
+    Image.new(mode, size, color).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+@override_settings(AVATAR_BACKGROUND=False)
+class AvatarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password', nickname='author')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        # Хранилище поля создано при импорте моделей, MEDIA_ROOT берет из настроек.
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = avatars.storage()
+        self.client.force_login(self.user)
+
+    def upload(self, uploaded):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('settings'), {
+                'email': self.user.email,
+                'nickname': self.user.nickname,
+                'avatar': uploaded,
+            })
+        self.assertEqual(response.status_code, 302)
+        return User.objects.get(pk=self.user.pk)
+
+    def test_thumbnails(self):
+        user = self.upload(image_file('Photo.PNG', mode='RGBA', color=(0, 0, 255, 0)))
+        self.assertRegex(user.avatar.name, r'^avatars/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertTrue(user.avatar_thumbnails)
+        for size in avatars.SIZES:
+            with self.storage.open(avatars.variant_name(user.avatar.name, size, 'webp')) as variant:
+                image = Image.open(variant)
+                self.assertEqual((image.format, image.size), ('WEBP', (size, size)))
+            with self.storage.open(avatars.variant_name(user.avatar.name, size, 'jpg')) as variant:
+                image = Image.open(variant)
+                self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+        # Шапка берет миниатюры, а не оригинал.
+        response = self.client.get(reverse('settings'))
+        self.assertContains(response, avatars.variant_url(user, 50, 'webp'))
+        self.assertContains(response, f'<img src="{avatars.variant_url(user, 50, "jpg")}"')
+
+    def test_same_content_same_name(self):
+        first = self.upload(image_file('a.png')).avatar.name
+        second = self.upload(image_file('b.png')).avatar.name
+        self.assertEqual(first, second)
+        third = self.upload(image_file('a.png', color='green')).avatar.name
+        self.assertNotEqual(first, third)
+
+    def test_broken_image_keeps_original(self):
+        with self.assertLogs('main.avatars', 'WARNING'):
+            user = self.upload(SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg'))
+        self.assertFalse(user.avatar_thumbnails)
+        self.assertEqual(avatars.variant_url(user, 64, 'webp'), user.avatar.url)
+
+    def test_command_builds_missing(self):
+        User.objects.filter(pk=self.user.pk).update(avatar=self.storage.save('avatars/old.jpg', image_file(
+            'old.jpg', image_format='JPEG')))
+        call_command('build_avatar_thumbnails', rename=True, stdout=StringIO())
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.avatar_thumbnails)
+        self.assertRegex(user.avatar.name, r'^avatars/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertTrue(self.storage.exists(avatars.variant_name(user.avatar.name, 64, 'jpg')))
+
+
+class FileServingTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.static_root = os.path.join(root, 'static')
+        self.media_root = os.path.join(root, 'media')
+        settings_override = override_settings(
+            STATIC_ROOT=self.static_root, MEDIA_ROOT=self.media_root, MEDIA_SENDFILE=None
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self, root, name, content):
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+
+    def test_collectstatic_compresses_hashed_files(self):
+        css = b'body { color: red; }\n' * 100
+        self.write(self.static_root, 'css/app.css', css)
+        self.write(self.static_root, 'css/tiny.css', b'a{}')
+        storage = CompressedManifestStaticFilesStorage(location=self.static_root)
+        paths = {name: (storage, name) for name in ('css/app.css', 'css/tiny.css')}
+        list(storage.post_process(paths))
+
+        hashed = storage.hashed_files['css/app.css']
+        self.assertNotEqual(hashed, 'css/app.css')
+        with storage.open(hashed + '.gz') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), css)
+        # Слишком маленькие файлы не сжимаются.
+        self.assertFalse(storage.exists(storage.hashed_files['css/tiny.css'] + '.gz'))
+
+    def test_static_negotiates_encoding(self):
+        css = b'body { color: red; }\n' * 100
+        self.write(self.static_root, 'css/app.css', css)
+        self.write(self.static_root, 'css/app.css.gz', gzip.compress(css))
+        url = '/static/css/app.css'
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), css)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        for accept in ('', 'gzip;q=0', 'identity'):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING=accept)
+            self.assertNotIn('Content-Encoding', response)
+            self.assertEqual(b''.join(response.streaming_content), css)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/static/../secret.txt').status_code, 404)
+
+    def test_static_hashed_names_are_immutable(self):
+        self.write(self.static_root, 'css/app.css', b'a{}')
+        self.write(self.static_root, 'css/app.0123456789ab.css', b'a{}')
+        original = serving._hashed_names
+        serving._hashed_names = frozenset({'css/app.0123456789ab.css'})
+        try:
+            response = self.client.get('/static/css/app.0123456789ab.css')
+            self.assertIn('immutable', response['Cache-Control'])
+            response = self.client.get('/static/css/app.css')
+            self.assertNotIn('immutable', response['Cache-Control'])
+        finally:
+            serving._hashed_names = original
+
+    def test_media_ranges(self):
+        content = bytes(range(256)) * 40
+        self.write(self.media_root, 'avatars/file.jpg', content)
+        url = '/media/avatars/file.jpg'
+
+        response = self.client.get(url)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+        for header, start, end in (('bytes=10-19', 10, 19), ('bytes=10000-', 10000, 10239),
+                                   ('bytes=-5', 10235, 10239), ('bytes=10230-99999', 10230, 10239)):
+            response = self.client.get(url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{len(content)}')
+            self.assertEqual(b''.join(response.streaming_content), content[start:end + 1])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=20000-')
+        self.assertEqual(response.status_code, 416)
+        # Несколько диапазонов не поддерживаем: отдаем весь файл.
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+        response = self.client.get(url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='Wed, 01 Jan 2020 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_media_sendfile(self):
+        name = 'avatars/ab/' + 'ab' * 32 + '_64.webp'
+        self.write(self.media_root, name, b'webp')
+        with self.settings(MEDIA_SENDFILE='X-Accel-Redirect'):
+            response = self.client.get('/media/' + name)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + name)
+        self.assertEqual(response.content, b'')
+        # Имя по хешу содержимого кэшируется навсегда.
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class AsyncURLConf:
+    """main.urls as it is with ASYNC_VIEWS = True."""
+
+    urlpatterns = [
+        path(str(pattern.pattern), getattr(async_views, pattern.callback.__name__), name=pattern.name)
+        if hasattr(async_views, pattern.callback.__name__) else pattern
+        for pattern in urls.urlpatterns
+    ]
+
+
+# Части страницы читаются в отдельных потоках со своими соединениями, которые
+# не видят незакоммиченную транзакцию TestCase.
+@override_settings(
+    ROOT_URLCONF=AsyncURLConf,
+    DEBUG=True,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    VOTE_BUFFER_ENABLED=False,
+)
+class AsyncViewsTests(TransactionTestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('author', 'author@example.com', 'password')
+        self.tag = Tag.objects.create(title='python')
+        self.question = Question.objects.create(title='Async question', text='Body', author=self.user)
+        self.question.tags.add(self.tag)
+        Answer.objects.create(text='First answer', author=self.user, question=self.question)
+
+    async def test_pages(self):
+        for url in (reverse('index'), reverse('hot_questions'), reverse('tag', args=['python']),
+                    reverse('question', args=[self.question.id])):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertContains(response, 'Async question')
+            self.assertContains(response, 'python')
+            # Запросы из рабочих потоков тоже попадают в статистику.
+            self.assertGreater(int(response['X-Perf-Queries']), 0)
+
+        response = await self.async_client.get(reverse('question', args=[self.question.id]))
+        self.assertContains(response, 'First answer')
+
+    async def test_missing_objects(self):
+        response = await self.async_client.get(reverse('tag', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('question', args=[self.question.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_votes(self):
+        url = reverse('toggle_like')
+        response = await self.async_client.post(url, {'id': self.question.id})
+        self.assertEqual(response.status_code, 302)
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        self.assertEqual((await self.async_client.get(url)).status_code, 405)
+        response = await self.async_client.post(url, {'id': self.question.id})
+        self.assertEqual(response.json(), {'liked': True, 'total_likes': 1, 'total_dislikes': 0})
+        response = await self.async_client.post(reverse('toggle_dislike'), {'id': self.question.id})
+        self.assertEqual(response.json(), {'disliked': True, 'total_likes': 0, 'total_dislikes': 1})
+        self.assertEqual(await Vote.objects.filter(question=self.question).acount(), 1)
+        response = await self.async_client.post(url, {'id': 'x'})
+        self.assertEqual(response.status_code, 404)
@@ -1,19 +1,31 @@
 from django.urls import path
-from . import views
-from django.conf.urls.static import static
+from . import api, async_views, perf, views
 from django.conf import settings
+
+# Ленты, страница вопроса и голосование есть в двух вариантах, см. ASYNC_VIEWS.
+read_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('', views.index, name='index'),
+    path('', read_views.index, name='index'),
     path('ask/', views.ask, name='ask'),
     path('login/', views.login_view, name='login'),
     path('settings/', views.settings, name='settings'),
-    path('tag/<str:tag_name>/', views.tag, name='tag'),
+    path('tag/<str:tag_name>/', read_views.tag, name='tag'),
     path('signup/', views.signup, name='signup'),
-    path('question/<int:question_id>/', views.question, name='question'),
+    path('question/<int:question_id>/', read_views.question, name='question'),
+    path('question/<int:question_id>/answers/', views.question_answers, name='question_answers'),
     path('answer/<int:question_id>/', views.answer, name='answer'),
     path('logout/', views.logout_view, name='logout'),
-    path('like/', views.toggle_like, name='toggle_like'),
-    path('dislike/', views.toggle_dislike, name='toggle_dislike'),
-    path('hot/', views.hot_questions, name='hot_questions'),
+    path('like/', read_views.toggle_like, name='toggle_like'),
+    path('dislike/', read_views.toggle_dislike, name='toggle_dislike'),
+    path('hot/', read_views.hot_questions, name='hot_questions'),
+    path('search/', views.search, name='search'),
+    path('tags/suggest/', views.tags_suggest, name='tags_suggest'),
     path('mark-correct/', views.mark_as_correct, name='mark_correct'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/questions/', api.new_questions, name='api_new_questions'),
+    path('api/questions/hot/', api.hot_questions, name='api_hot_questions'),
+    path('api/questions/<int:question_id>/', api.question, name='api_question'),
+    path('api/questions/<int:question_id>/answers/', api.question_answers, name='api_question_answers'),
+    path('api/tags/<str:tag_name>/questions/', api.tag_questions, name='api_tag_questions'),
+    path('_perf/', perf.summary_view, name='perf_summary'),
+]
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Истекшая версия получает новое значение, это только лишний промах кэша.
+VERSION_TIMEOUT = 24 * 60 * 60
+
+# Версии для условных GET (main.conditional): когда в последний раз менялось
+# то, что видно на страницах.
+QUESTIONS_KEY = 'version:questions'   # новый, измененный или удаленный вопрос
+ACTIVITY_KEY = 'version:activity'     # голос или ответ на любой вопрос
+USERS_KEY = 'version:users'           # имя или аватар любого автора
+TAG_INDEX_KEY = 'version:tag_index'   # новые теги для main.tag_index
+
+
+def get_cache():
+    return caches[getattr(settings, 'VERSIONS_CACHE', 'default')]
+
+
+def question_key(question_id):
+    return f'version:question:{question_id}'
+
+
+def user_key(user_id):
+    return f'version:user:{user_id}'
+
+
+def activity_key(question_id):
+    return f'version:activity:{question_id}'
+
+
+def tag_key(title):
+    return f'version:tag:{title}'
+
+
+def get_many(keys):
+    """Current versions of ``keys``; missing ones are initialized.
+
+    A version is a nanosecond timestamp rather than a counter starting at
+    zero: if a key is evicted it gets a new value that can never match a
+    fragment cached under an older version.
+    """
+    versions = get_cache().get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        get_cache().set_many({key: now for key in missing}, VERSION_TIMEOUT)
+        versions.update({key: now for key in missing})
+    return versions
+
+
+def bump(*keys):
+    # После коммита: иначе параллельный запрос успеет закэшировать фрагмент
+    # со старыми данными уже под новой версией.
+    def set_versions():
+        now = time.time_ns()
+        get_cache().set_many({key: now for key in keys}, VERSION_TIMEOUT)
+
+    transaction.on_commit(set_versions)
+
+
+def bump_pages():
+    """Invalidate every conditional GET after rows were changed in bulk."""
+    bump(QUESTIONS_KEY, ACTIVITY_KEY, USERS_KEY)
@@ -1,132 +1,124 @@
 import json
 
-from django.core.cache import cache
-from django.db import transaction
-from django.db.models import F
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from .models import Question, Tag, User, Answer
+from .models import Question, QuestionTag, Tag, Answer, Vote
 from .forms import AskForm, AnswerForm
 from .forms import LoginForm, SignUpForm
+from .votes import attach_vote_state, cast_vote
+from . import avatars, tag_index, vote_buffer
 import logging
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404
+from .pagination import MAX_PAGE_NUMBER, KeysetPaginator, paginate_feed
+from .fragments import render_question_cards
+from .conditional import conditional_page, feed_keys, question_keys, tag_keys
 
 logger = logging.getLogger(__name__)
 
+ANSWERS_PER_PAGE = 30
 
+# Поля вопроса для карточек лент (views, async_views, api).
+FEED_FIELDS = ('id', 'title', 'preview', 'created_at', 'author', 'likes_count', 'dislikes_count',
+               'answers_count')
+
+# Ленты тегов читаются из списков QuestionTag по индексам (tag, ...).
+TAG_FEED_ORDERINGS = {
+    'new': ('-created_at', '-question_id'),
+    'best': ('-likes_count', '-question_id'),
+}
+MAX_FEED_TAGS = 5
+
+
+@conditional_page(feed_keys)
 def index(request):
-    popular_tags = cache.get_or_set(
-        'popular_tags',
-        Tag.objects.popular_tags,
-        300
-    )
-    best_members = cache.get_or_set(
-        'best_members',
-        User.objects.best_members,
-        300
-    )
-    questions = Question.objects.all() \
-        .only('id', 'title', 'created_at', 'author_id', 'likes_count') \
-        .select_related('author') \
-        .prefetch_related('tags') \
-        .order_by('-created_at')
-
-    paginator = Paginator(questions, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    questions = Question.objects.only(*FEED_FIELDS).select_related('author')
+
+    page_obj = paginate_feed(request, questions, ('-created_at', '-id'), 20)
+    page_obj.object_list = attach_vote_state(page_obj.object_list, request.user)
+    vote_buffer.apply_pending(page_obj.object_list)
+    render_question_cards(page_obj.object_list)
 
     context = {
         'questions': page_obj,
-        'popular_tags': popular_tags,
-        'best_members': best_members,
         'title': 'New Questions'
     }
     return render(request, 'main/index.html', context)
 
 
+@conditional_page(feed_keys)
 def hot_questions(request):
-    questions_list = Question.objects.all() \
-        .only('id', 'title', 'created_at', 'author_id', 'likes_count') \
-        .select_related('author') \
-        .prefetch_related('tags') \
-        .order_by('-likes_count', '-created_at')
-
-    paginator = Paginator(questions_list, 20)
-    page_number = request.GET.get('page')
-    questions = paginator.get_page(page_number)
+    questions_list = Question.objects.only(*FEED_FIELDS, 'hot_score').select_related('author')
 
-    popular_tags = cache.get_or_set('popular_tags', Tag.objects.popular_tags, 300)
-    best_members = cache.get_or_set('best_members', User.objects.best_members, 300)
+    questions = paginate_feed(request, questions_list, ('-hot_score', '-id'), 20)
+    questions.object_list = attach_vote_state(questions.object_list, request.user)
+    vote_buffer.apply_pending(questions.object_list)
+    render_question_cards(questions.object_list)
 
     return render(request, 'main/index.html', {
         'questions': questions,
-        'popular_tags': popular_tags,
-        'best_members': best_members,
         'title': 'Hot Questions',
     })
 
 
-@login_required
-@require_POST
-@transaction.atomic
-def toggle_like(request):
-    question_id = request.POST.get('id')
-    question = get_object_or_404(Question, pk=question_id)
-    user = request.user
+def search(request):
+    query = request.GET.get('q', '').strip()[:200]
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+    if page_number > MAX_PAGE_NUMBER:
+        raise Http404('Search results are limited')
+
+    per_page = 20
+    questions = []
+    if query:
+        questions = Question.objects.search(
+            query,
+            limit=per_page + 1,
+            offset=(page_number - 1) * per_page
+        )
 
-    if question.likes.filter(id=user.id).exists():
-        question.likes.remove(user)
-        question.likes_count = F('likes_count') - 1
-        liked = False
-    else:
-        question.likes.add(user)
-        question.likes_count = F('likes_count') + 1
-        if question.dislikes.filter(id=user.id).exists():
-            question.dislikes.remove(user)
-            question.dislikes_count = F('dislikes_count') - 1
-        liked = True
+    return render(request, 'main/search.html', {
+        'query': query,
+        'questions': questions[:per_page],
+        'page_number': page_number,
+        'has_next': len(questions) > per_page and page_number < MAX_PAGE_NUMBER,
+    })
 
-    question.save(update_fields=['likes_count', 'dislikes_count'])
-    question.refresh_from_db()
 
-    return JsonResponse({
-        'liked': liked,
-        'total_likes': question.likes_count,
-        'total_dislikes': question.dislikes_count
-    })
+@login_required
+@require_POST
+def toggle_like(request):
+    return vote(request, Vote.LIKE, 'liked')
 
 
 @login_required
 @require_POST
-@transaction.atomic
 def toggle_dislike(request):
-    question_id = request.POST.get('id')
-    question = get_object_or_404(Question, pk=question_id)
-    user = request.user
+    return vote(request, Vote.DISLIKE, 'disliked')
 
-    if question.dislikes.filter(id=user.id).exists():
-        question.dislikes.remove(user)
-        question.dislikes_count = F('dislikes_count') - 1
-        disliked = False
-    else:
-        question.dislikes.add(user)
-        question.dislikes_count = F('dislikes_count') + 1
-        if question.likes.filter(id=user.id).exists():
-            question.likes.remove(user)
-            question.likes_count = F('likes_count') - 1
-        disliked = True
 
-    question.save(update_fields=['likes_count', 'dislikes_count'])
-    question.refresh_from_db()
+def vote(request, value, state_key):
+    return vote_response(request.user, request.POST.get('id'), value, state_key)
+
+
+def vote_response(user, question_id, value, state_key):
+    # Общая часть для async_views.vote.
+    try:
+        question_id = int(question_id)
+        current, likes_count, dislikes_count = cast_vote(user, question_id, value)
+    except (TypeError, ValueError, Question.DoesNotExist):
+        raise Http404('Question not found')
 
     return JsonResponse({
-        'disliked': disliked,
-        'total_likes': question.likes_count,
-        'total_dislikes': question.dislikes_count
+        state_key: current == value,
+        'total_likes': likes_count,
+        'total_dislikes': dislikes_count
     })
 
 
@@ -170,26 +162,21 @@ def mark_as_correct(request):
         logger.error(f"Error in mark_as_correct: {str(e)}")
         return JsonResponse({'error': str(e)}, status=400)
 
+@conditional_page(question_keys)
 def question(request, question_id):
     try:
-        popular_tags = Tag.objects.popular_tags()
-        best_members = User.objects.best_members()
-
         me_question = get_object_or_404(
             Question.objects.select_related('author')
             .prefetch_related('tags'),
             pk=question_id
         )
+        vote_buffer.apply_pending([me_question])
 
-        answers = Answer.objects.filter(question=me_question) \
-            .select_related('author') \
-            .order_by('-is_correct', 'created_at')
+        answers = answers_paginator(me_question).get_page()
 
         context = {
             'question': me_question,
             'answers': answers,
-            'popular_tags': popular_tags,
-            'best_members': best_members,
         }
         return render(request, 'main/question.html', context)
 
@@ -197,11 +184,27 @@ def question(request, question_id):
         logger.error(f"Error in question view: {str(e)}")
 
 
+def question_answers(request, question_id):
+    question = get_object_or_404(Question.objects.only('id', 'author_id'), pk=question_id)
+    answers = answers_paginator(question).get_page(request.GET.get('cursor'))
+
+    html = render_to_string('main/includes/answers.html', {
+        'question': question,
+        'answers': answers,
+    }, request=request)
+    return JsonResponse({
+        'html': html,
+        'next_cursor': answers.next_cursor,
+    })
+
+
+def answers_paginator(question):
+    answers = Answer.objects.filter(question=question).select_related('author')
+    return KeysetPaginator(answers, ('-is_correct', 'created_at', 'id'), ANSWERS_PER_PAGE)
+
+
 @login_required
 def ask(request):
-    popular_tags = Tag.objects.popular_tags()
-    best_members = User.objects.best_members()
-
     if request.method == 'POST':
         form = AskForm(request.POST)
         if form.is_valid():
@@ -212,14 +215,20 @@ def ask(request):
 
     context = {
         'form': form,
-        'popular_tags': popular_tags,
-        'best_members': best_members,
     }
     return render(request, 'main/ask.html', context)
 
+def tags_suggest(request):
+    prefix = request.GET.get('q', '')[:Tag._meta.get_field('title').max_length]
+    suggestions = tag_index.suggest(prefix)
+    response = JsonResponse({
+        'tags': [{'title': title, 'questions_count': count} for title, count in suggestions],
+    })
+    # Подсказки не обязаны быть свежими до секунды.
+    patch_cache_control(response, max_age=60)
+    return response
+
 def login_view(request):
-    popular_tags = Tag.objects.popular_tags()
-    best_members = User.objects.best_members()
     if request.method == 'POST':
         form = LoginForm(request.POST)
         if form.is_valid():
@@ -241,15 +250,11 @@ def login_view(request):
 
     context = {
         'form': form,
-        'popular_tags': popular_tags,
-        'best_members': best_members,
     }
     return render(request, 'main/login.html', context)
 
 
 def signup(request):
-    popular_tags = Tag.objects.popular_tags()
-    best_members = User.objects.best_members()
     if request.method == 'POST':
         form = SignUpForm(request.POST, request.FILES)
         if form.is_valid():
@@ -267,8 +272,6 @@ def signup(request):
 
     context = {
         'form': form,
-        'popular_tags': popular_tags,
-        'best_members': best_members,
     }
     return render(request, 'main/signup.html', context)
 
@@ -277,31 +280,54 @@ def logout_view(request):
     return redirect('index')
 
 
+@conditional_page(tag_keys)
 def tag(request, tag_name):
-    popular_tags = Tag.objects.popular_tags()
-    best_members = User.objects.best_members()
-    tag = get_object_or_404(Tag, title=tag_name)
+    tags = resolve_tags(tag_name)
+    sort = feed_sort(request)
+    postings = tagged_postings(tags, FEED_FIELDS)
 
-    questions = Question.objects.filter(tags=tag)\
-        .only('id', 'title', 'created_at', 'author_id')\
-        .select_related('author')\
-        .prefetch_related('tags')\
-        .order_by('-created_at')
-
-    paginator = Paginator(questions, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_feed(request, postings, TAG_FEED_ORDERINGS[sort], 10)
+    page_obj.object_list = [posting.question for posting in page_obj.object_list]
+    page_obj.object_list = attach_vote_state(page_obj.object_list, request.user)
+    vote_buffer.apply_pending(page_obj.object_list)
+    render_question_cards(page_obj.object_list)
 
     context = {
-        'tag': tag,
+        'tags': tags,
+        'sort': sort,
         'questions': page_obj,
-        'popular_tags': popular_tags,
-        'best_members': best_members,
     }
 
     return render(request, 'main/tag.html', context)
 
 
+def resolve_tags(tag_name):
+    """Tags of ``/tag/a+b/``; a title that itself contains ``+`` wins."""
+    titles = list(dict.fromkeys(title for title in tag_name.split('+') if title))
+    if not titles or len(titles) > MAX_FEED_TAGS:
+        raise Http404('Tag not found')
+
+    found = {tag.title: tag for tag in Tag.objects.filter(title__in=[tag_name, *titles])}
+    if tag_name in found:
+        return [found[tag_name]]
+    if len(found) < len(titles):
+        raise Http404('Tag not found')
+    return [found[title] for title in titles]
+
+
+def feed_sort(request):
+    sort = request.GET.get('sort')
+    return sort if sort in TAG_FEED_ORDERINGS else 'new'
+
+
+def tagged_postings(tags, question_fields):
+    # Вопрос и автор приходят тем же запросом: join по первичным ключам
+    # только для строк страницы, взятых из индекса списка тега.
+    return QuestionTag.objects.intersection(tags) \
+        .select_related('question__author') \
+        .only('question', 'created_at', 'likes_count', *(f'question__{name}' for name in question_fields))
+
+
 @login_required
 def answer(request, question_id):
     question = get_object_or_404(Question, pk=question_id)
@@ -316,8 +342,6 @@ def answer(request, question_id):
 
 @login_required
 def settings(request):
-    popular_tags = Tag.objects.popular_tags()
-    best_members = User.objects.best_members()
     user = request.user
 
     if request.method == 'POST':
@@ -325,14 +349,13 @@ def settings(request):
         user.nickname = request.POST.get('nickname', user.nickname)
 
         if 'avatar' in request.FILES:
-            user.avatar = request.FILES['avatar']
+            avatars.set_avatar(user, request.FILES['avatar'])
 
         user.save()
+        avatars.schedule_thumbnails(user)
         return redirect('settings')
 
     context = {
-        'popular_tags': popular_tags,
-        'best_members': best_members,
         'user': user
     }
 
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import Case, F, Value, When
+
+from . import ranking
+from .models import Question, QuestionTag
+
+logger = logging.getLogger(__name__)
+
+SEQ_KEY = 'vote_buffer:seq'
+FLUSHED_KEY = 'vote_buffer:flushed'
+HOLE_KEY = 'vote_buffer:hole'
+FLUSH_LOCK_KEY = 'vote_buffer:flush_lock'
+FLUSH_LOCK_TIMEOUT = 60
+BATCH_SIZE = 500
+
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'VOTE_BUFFER_ENABLED', False)
+
+
+def get_cache():
+    return caches[getattr(settings, 'VOTE_BUFFER_CACHE', 'default')]
+
+
+def entry_key(number):
+    return f'vote_buffer:entry:{number}'
+
+
+def pending_keys(question_id):
+    return f'vote_buffer:pending:{question_id}:likes', f'vote_buffer:pending:{question_id}:dislikes'
+
+
+def record(question_id, likes_delta, dislikes_delta):
+    """Append a counter change of one question to the buffer journal.
+
+    Every change gets a sequence number; ``flush`` merges the journal into
+    the database in order. Running per-question sums are kept next to it so
+    reads can add what is not flushed yet.
+    """
+    cache = get_cache()
+    cache.add(SEQ_KEY, 0, None)
+    number = cache.incr(SEQ_KEY)
+    cache.set(entry_key(number), (question_id, likes_delta, dislikes_delta), None)
+
+    for key, delta in zip(pending_keys(question_id), (likes_delta, dislikes_delta)):
+        if delta:
+            cache.add(key, 0, None)
+            cache.incr(key, delta)
+
+    start_flusher()
+
+
+def pending(question_ids):
+    """Return ``{question_id: (likes_delta, dislikes_delta)}`` not flushed yet."""
+    keys = {
+        question_id: pending_keys(question_id) for question_id in question_ids
+    }
+    values = get_cache().get_many([key for pair in keys.values() for key in pair])
+    return {
+        question_id: (values.get(likes_key, 0), values.get(dislikes_key, 0))
+        for question_id, (likes_key, dislikes_key) in keys.items()
+    }
+
+
+def backlog():
+    """Number of journal entries not merged into the database yet."""
+    cache = get_cache()
+    return cache.get(SEQ_KEY, 0) - cache.get(FLUSHED_KEY, 0)
+
+
+def apply_pending(questions):
+    """Add buffered deltas to ``likes_count``/``dislikes_count`` of loaded questions."""
+    if not enabled() or not questions:
+        return questions
+    deltas = pending([question.id for question in questions])
+    for question in questions:
+        likes_delta, dislikes_delta = deltas[question.id]
+        question.likes_count += likes_delta
+        question.dislikes_count += dislikes_delta
+    return questions
+
+
+def flush():
+    """Merge buffered deltas into Question counters. Returns the number of
+    journal entries applied."""
+    cache = get_cache()
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    applied = 0
+    try:
+        flushed = cache.get(FLUSHED_KEY, 0)
+        last = cache.get(SEQ_KEY, 0)
+        stalled = False
+        while flushed < last and not stalled:
+            numbers = range(flushed + 1, min(last, flushed + BATCH_SIZE) + 1)
+            entries = cache.get_many([entry_key(number) for number in numbers])
+
+            totals = defaultdict(lambda: [0, 0])
+            done = flushed
+            for number in numbers:
+                entry = entries.get(entry_key(number))
+                if entry is None:
+                    # Номер уже выдан, но запись еще не сохранена. Ждем ее
+                    # до следующего сброса, а потом считаем потерянной.
+                    if cache.get(HOLE_KEY) != number:
+                        cache.set(HOLE_KEY, number, None)
+                        stalled = True
+                        break
+                    logger.warning('Vote buffer entry %s is lost, skipping it', number)
+                else:
+                    question_id, likes_delta, dislikes_delta = entry
+                    totals[question_id][0] += likes_delta
+                    totals[question_id][1] += dislikes_delta
+                done = number
+
+            if done == flushed:
+                break
+
+            apply_deltas(totals)
+            cache.set(FLUSHED_KEY, done, None)
+            cache.delete_many([entry_key(number) for number in range(flushed + 1, done + 1)])
+            for question_id, deltas in totals.items():
+                for key, delta in zip(pending_keys(question_id), deltas):
+                    if delta:
+                        cache.incr(key, -delta)
+
+            applied += done - flushed
+            flushed = done
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+    return applied
+
+
+def apply_deltas(totals):
+    question_ids = list(totals)
+    with transaction.atomic():
+        for start in range(0, len(question_ids), BATCH_SIZE):
+            chunk = question_ids[start:start + BATCH_SIZE]
+            Question.objects.filter(pk__in=chunk).update(
+                likes_count=F('likes_count') + Case(
+                    *[When(pk=pk, then=Value(totals[pk][0])) for pk in chunk if totals[pk][0]],
+                    default=Value(0)
+                ),
+                dislikes_count=F('dislikes_count') + Case(
+                    *[When(pk=pk, then=Value(totals[pk][1])) for pk in chunk if totals[pk][1]],
+                    default=Value(0)
+                ),
+                hot_score=F('hot_score') + Case(
+                    *[When(pk=pk, then=Value(ranking.vote_delta(*totals[pk]))) for pk in chunk],
+                    default=Value(0.0)
+                ),
+            )
+            liked = [pk for pk in chunk if totals[pk][0]]
+            if liked:
+                QuestionTag.objects.filter(question_id__in=liked).update(
+                    likes_count=F('likes_count') + Case(
+                        *[When(question_id=pk, then=Value(totals[pk][0])) for pk in liked],
+                        default=Value(0)
+                    ),
+                )
+
+
+def start_flusher():
+    """Start the in-process flush thread once, if VOTE_BUFFER_FLUSH_INTERVAL is set.
+
+    With a per-process cache such as locmem this thread is the only thing that
+    can see the buffer; with a shared cache the flush_vote_buffer command can
+    be used instead.
+    """
+    global _flusher_started
+    interval = getattr(settings, 'VOTE_BUFFER_FLUSH_INTERVAL', None)
+    if not interval or _flusher_started:
+        return
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+    threading.Thread(target=run_flusher, args=(interval,), daemon=True).start()
+
+
+def run_flusher(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Vote buffer flush failed')
+        finally:
+            connections.close_all()
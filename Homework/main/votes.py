@@ -0,0 +1,130 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import ranking, versions, vote_buffer
+from .models import Question, QuestionTag, Vote
+
+
+def attach_vote_state(questions, user):
+    """Set ``is_liked``/``is_disliked`` on every question of a feed page.
+
+    The state of the whole page is resolved with one query against the vote
+    table instead of loading the voter lists of each question.
+    """
+    questions = list(questions)
+    for question in questions:
+        question.is_liked = False
+        question.is_disliked = False
+
+    if not questions or not user.is_authenticated:
+        return questions
+
+    votes = dict(
+        Vote.objects
+        .filter(user_id=user.id, question_id__in=[question.id for question in questions])
+        .values_list('question_id', 'value')
+    )
+    for question in questions:
+        value = votes.get(question.id)
+        question.is_liked = value == Vote.LIKE
+        question.is_disliked = value == Vote.DISLIKE
+    return questions
+
+
+def cast_vote(user, question_id, value):
+    """Toggle the ``value`` vote of ``user`` on a question.
+
+    Voting again with the same value removes the vote, voting with the
+    opposite value flips it. Returns ``(current_value, likes_count,
+    dislikes_count)`` where ``current_value`` is 0 when no vote is left.
+
+    The vote row is changed with an insert-or-nothing followed, only for
+    existing votes, by a delete or update. The copies of ``likes_count`` in
+    the tag postings are updated next. The question row (counters and
+    ``hot_score``) is touched once, by the last statement of the
+    transaction, so its lock is held for a single round trip. With
+    VOTE_BUFFER_ENABLED the counter change goes to ``vote_buffer`` instead
+    and the row is only read. Raises Question.DoesNotExist for an unknown
+    question.
+    """
+    vote_table = Vote._meta.db_table
+    question_table = Question._meta.db_table
+    posting_table = QuestionTag._meta.db_table
+    deltas = {Vote.LIKE: 0, Vote.DISLIKE: 0}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {vote_table} (user_id, question_id, value, created_at) '
+            f'VALUES (%s, %s, %s, %s) '
+            f'ON CONFLICT (user_id, question_id) DO NOTHING',
+            [user.id, question_id, value, connection.ops.adapt_datetimefield_value(timezone.now())]
+        )
+        if cursor.rowcount:
+            current = value
+            deltas[value] += 1
+        else:
+            cursor.execute(
+                f'DELETE FROM {vote_table} '
+                f'WHERE user_id = %s AND question_id = %s AND value = %s',
+                [user.id, question_id, value]
+            )
+            if cursor.rowcount:
+                current = 0
+                deltas[value] -= 1
+            else:
+                cursor.execute(
+                    f'UPDATE {vote_table} SET value = %s '
+                    f'WHERE user_id = %s AND question_id = %s',
+                    [value, user.id, question_id]
+                )
+                if cursor.rowcount:
+                    current = value
+                    deltas[value] += 1
+                    deltas[-value] -= 1
+                else:
+                    # Голос удалили параллельным запросом между нашими шагами.
+                    current = 0
+
+        if vote_buffer.enabled():
+            # Счетчики копятся в кэше и сбрасываются в базу пачками,
+            # строку вопроса здесь не блокируем вовсе.
+            cursor.execute(
+                f'SELECT likes_count, dislikes_count FROM {question_table} WHERE id = %s',
+                [question_id]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise Question.DoesNotExist(f'Question {question_id} does not exist')
+            if deltas[Vote.LIKE] or deltas[Vote.DISLIKE]:
+                transaction.on_commit(lambda: vote_buffer.record(
+                    question_id, deltas[Vote.LIKE], deltas[Vote.DISLIKE]
+                ))
+        else:
+            if deltas[Vote.LIKE]:
+                # Копия likes_count в списках тегов (лента тега по лайкам).
+                cursor.execute(
+                    f'UPDATE {posting_table} SET likes_count = likes_count + %s WHERE question_id = %s',
+                    [deltas[Vote.LIKE], question_id]
+                )
+            cursor.execute(
+                f'UPDATE {question_table} '
+                f'SET likes_count = likes_count + %s, dislikes_count = dislikes_count + %s, '
+                f'hot_score = hot_score + %s '
+                f'WHERE id = %s '
+                f'RETURNING likes_count, dislikes_count',
+                [
+                    deltas[Vote.LIKE], deltas[Vote.DISLIKE],
+                    ranking.vote_delta(deltas[Vote.LIKE], deltas[Vote.DISLIKE]),
+                    question_id,
+                ]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise Question.DoesNotExist(f'Question {question_id} does not exist')
+
+        versions.bump(versions.activity_key(question_id), versions.ACTIVITY_KEY)
+
+    if vote_buffer.enabled():
+        likes_delta, dislikes_delta = vote_buffer.pending([question_id])[question_id]
+        return current, row[0] + likes_delta, row[1] + dislikes_delta
+    return current, row[0], row[1]